@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Sentsore anitzen lerrokatzea maiztasun finkoko sareta batean.
+
+Sentsore bakoitza behin pasatzen da: sareta-puntu bakoitzak puntu hori
+baino lehenagoko (edo berdineko) azken lagina hartzen du, searchsorted
+bidez, eta lagin hori `tolerance_ms` baino zaharragoa bada NaN geratzen
+da. Sareta epoch-ari lotuta dago (period_ms-ren multiploak), beraz leiho
+gainjarriek puntu berak partekatzen dituzte zikloz ziklo.
+
+Emaitza denbora bektore bat (int64 ns) eta (n, sentsore) float64 array
+jarraitu bat da; align_frames-ek DataFrame moduan ematen du, sentsore
+guztiek balio freskoa duten lerroekin.
+
+Detektagailuetan aukerakoa da (ALIGN_PERIOD_MS > 0): lehenetsita
+influx.combine_fields-ek merge_asof nearest erabiltzen jarraitzen du, eta
+anomaliek laginen benetako timestamp-ak dituzte. Sareta aktibatzean
+errenkadak saretaren uneetan daude, `tolerance_ms` baino zaharragoak diren
+laginak dituztenak kentzen dira eta periodoa baino maizago datozen
+sentsoreak diezmatzen dira.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Detektagailuen saretaren periodoa (ms). 0 bada (lehenetsia)
+# influx.merge_fields-ek merge_asof (nearest, tolerantziarik gabe) erabiltzen
+# du; align()-ek GRID_PERIOD_MS hartzen du orduan periodorik ematen ez bada.
+ALIGN_PERIOD_MS = float(os.getenv("ALIGN_PERIOD_MS", 0))
+GRID_PERIOD_MS = 100
+# Lagin bat sareta-puntu baterako baliozkoa den gehieneko adina (ms).
+ALIGN_TOLERANCE_MS = float(os.getenv("ALIGN_TOLERANCE_MS", 500))
+
+
+def to_ns(times):
+    return pd.DatetimeIndex(times).as_unit("ns").asi8
+
+
+def align(series, period_ms=None, tolerance_ms=ALIGN_TOLERANCE_MS):
+    """[(denborak ns, balioak), ...] -> (sareta ns, (n, k) balioak)."""
+    if period_ms is None:
+        period_ms = ALIGN_PERIOD_MS or GRID_PERIOD_MS
+    if period_ms <= 0:
+        raise ValueError(f"Saretaren periodoa positiboa izan behar da: "
+                         f"{period_ms}")
+    period = int(period_ms * 1e6)
+    tolerance = int(tolerance_ms * 1e6)
+    filled = [t for t, _ in series if len(t)]
+    if not filled:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(series)))
+    start = -(-min(t[0] for t in filled) // period) * period
+    end = max(t[-1] for t in filled) // period * period
+    times = np.arange(start, end + 1, period, dtype=np.int64)
+    values = np.full((len(times), len(series)), np.nan)
+    for j, (t, v) in enumerate(series):
+        if not len(t):
+            continue
+        if np.any(t[1:] < t[:-1]):
+            order = np.argsort(t, kind="stable")
+            t, v = t[order], v[order]
+        pos = np.searchsorted(t, times, "right") - 1
+        fresh = pos >= 0
+        fresh[fresh] = times[fresh] - t[pos[fresh]] <= tolerance
+        values[fresh, j] = v[pos[fresh]]
+    return times, values
+
+
+def align_frames(frames, time_column="_time", period_ms=None,
+                 tolerance_ms=ALIGN_TOLERANCE_MS):
+    # frames: {eremua: DataFrame(time_column, eremua)}. Datu gabeko eremuak
+    # ez dira zutabe gisa agertzen, merge_fields-en bezala.
+    frames = {field: df for field, df in frames.items() if not df.empty}
+    if not frames:
+        return pd.DataFrame()
+    fields = list(frames)
+    tz = pd.DatetimeIndex(frames[fields[0]][time_column]).tz
+    times, values = align(
+        [(to_ns(df[time_column]), df[field].to_numpy(dtype=np.float64))
+         for field, df in frames.items()], period_ms, tolerance_ms)
+    complete = ~np.isnan(values).any(axis=1)
+    index = pd.to_datetime(times[complete], unit="ns")
+    if tz is not None:
+        index = index.tz_localize("UTC").tz_convert(tz)
+    df = pd.DataFrame(values[complete], columns=fields)
+    df.insert(0, time_column, index)
+    return df if not df.empty else pd.DataFrame()
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+Detektagailuek partekatzen duten InfluxDB datu-sarbidea.
+
+faults eta transitions zerbitzuek hemendik lortzen dituzte leihoak:
+zuzenean InfluxDB-tik (InfluxSource, leiho inkrementalarekin) edo
+INGEST_URL ezarrita badago, ingest zerbitzutik (RemoteSource). Azken
+horrek eremu guztiak behin kontsultatzen ditu ziklo bakoitzeko eta
+bi detektagailuei zerbitzatzen die. INGEST_MODE=mqtt bada, leihoak
+broker-etik zuzenean betetzen dira (common.stream.MqttSource).
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.request
+import warnings
+
+import pandas as pd
+from influxdb_client import InfluxDBClient
+from influxdb_client.client.warnings import MissingPivotFunction
+
+from common import alignment, metrics
+warnings.simplefilter("ignore", MissingPivotFunction)
+
+MEASUREMENT = "mqtt_consumer"
+# Ziklo bakoitzean azken puntutik aurrera bakarrik kontsultatu (0: leiho osoa)
+INCREMENTAL = os.getenv("INCREMENTAL_QUERY", "1") == "1"
+QUERY_OVERLAP = float(os.getenv("QUERY_OVERLAP", 2))
+# "field": eremu bakoitzeko kontsulta bat + merge_asof; "pivot": kontsulta
+# bakarra, zerbitzarian PIVOT_EVERY saretara lerrokatuta.
+QUERY_MODE = os.getenv("QUERY_MODE", "field")
+PIVOT_EVERY = os.getenv("PIVOT_EVERY", "100ms")
+# Kontsulta batek huts egiten badu, zenbat aldiz saiatu with_retry-n
+# (atzerapen esponentzialarekin; berrsaiakera geruza bakarra) eta HTTP
+# konexio multzoaren tamaina.
+QUERY_RETRIES = int(os.getenv("QUERY_RETRIES", 3))
+RETRY_BACKOFF = float(os.getenv("RETRY_BACKOFF", 0.5))
+POOL_SIZE = int(os.getenv("INFLUX_POOL_SIZE", 4))
+# Ezarrita badago, leihoak ingest zerbitzutik lortu (adib. http://ingest:8000)
+INGEST_URL = os.getenv("INGEST_URL", "")
+# "influx": InfluxDB-tik (edo INGEST_URL-tik); "mqtt": zuzenean broker-etik
+# harpidetuta (common.stream), InfluxDB emaitzak gordetzeko bakarrik.
+INGEST_MODE = os.getenv("INGEST_MODE", "influx")
+# Simulatzaileak lerro bat baino gehiago (REPLAY_LINES) errepikatzen baditu,
+# Telegraf-ek "line" etiketa gehitzen du: kontsultak lerro bakarrera mugatu
+# (adib. "line0"). Hutsik badago ez da iragazten.
+LINE = os.getenv("LINE", "")
+
+
+def connect():
+    # Ingurune aldagaietatik bezeroa sortu, konexio multzoarekin. HTTP
+    # mailan ez da berriro saiatzen: kontsultek with_retry erabiltzen dute,
+    # bi geruzek berrsaiakerak biderkatu ez ditzaten.
+    return InfluxDBClient(url=os.getenv("INFLUX_URL"),
+                          token=os.getenv("INFLUX_TOKEN"),
+                          org=os.getenv("ORGANIZATION"),
+                          connection_pool_maxsize=POOL_SIZE)
+
+
+def line_condition(line=None):
+    # Flux iragazkiari gehitzeko LINE baldintza, edo kate hutsa.
+    line = LINE if line is None else line
+    return f' and r["line"] == "{line}"' if line else ""
+
+
+def with_retry(func, *args, retries=None, backoff=None):
+    retries = QUERY_RETRIES if retries is None else retries
+    backoff = RETRY_BACKOFF if backoff is None else backoff
+    for attempt in range(retries + 1):
+        try:
+            return func(*args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            print(f"[INFO] Kontsultak huts egin du ({e}), berriro "
+                  f"saiatzen {attempt + 1}/{retries}...")
+            time.sleep(backoff * 2 ** attempt)
+
+
+def query_field(query_api, bucket, field, start):
+    # start: Flux-en range() hasiera, erlatiboa ("-800s") edo absolutua.
+    measurement = MEASUREMENT
+    line = line_condition()
+    query = f'''
+    from(bucket: "{bucket}")
+        |> range(start: {start})
+        |> filter(fn: (r) => r["_measurement"] == "{measurement}"{line})
+        |> filter(fn: (r) => r["_field"] == "{field}")
+        |> sort(columns: ["_time"])
+    '''
+
+    try:
+        # Lehen definitutako query-arentzat datuak lortu dataframe moduan.
+        with metrics.stage("query"):
+            result = with_retry(query_api.query_data_frame, query)
+        if isinstance(result, list):
+            df = pd.concat(result, ignore_index=True)
+        else:
+            df = result
+
+        if (not df.empty and "_time" in df.columns
+                and "_value" in df.columns):
+            df = df[["_time", "_value"]].rename(columns={"_value": field})
+
+            df["_time"] = pd.to_datetime(df["_time"])
+            df = df.dropna(subset=["_time"])
+
+            df[field] = pd.to_numeric(df[field], errors='coerce')
+            df = df.dropna(subset=[field])
+            df = df.sort_values("_time").reset_index(drop=True)
+
+            return df
+        else:
+            print(f"[INFO] Ez dira datuak aurkitu {field} eremurako.")
+    except Exception as e:
+        metrics.inc("influx_errors_total", operation="query")
+        print(f'[ERROREA]: Akatsa InfluxDB kontsultatzean: {e}')
+    return pd.DataFrame(columns=["_time", field])
+
+
+def query_pivot(query_api, bucket, fields, start, every):
+    # Eremu guztiak kontsulta bakarrean: zerbitzarian `every` sareta batera
+    # ekarri (leiho bakoitzeko azken balioa) eta pivot() bidez zutabetan.
+    measurement = MEASUREMENT
+    line = line_condition()
+    field_filter = " or ".join(f'r["_field"] == "{field}"'
+                               for field in fields)
+    query = f'''
+    from(bucket: "{bucket}")
+        |> range(start: {start})
+        |> filter(fn: (r) => r["_measurement"] == "{measurement}"{line})
+        |> filter(fn: (r) => {field_filter})
+        |> keep(columns: ["_start", "_stop", "_time", "_field", "_value"])
+        |> group(columns: ["_field"])
+        |> sort(columns: ["_time"])
+        |> aggregateWindow(every: {every}, fn: last, createEmpty: false,
+                           timeSrc: "_start")
+        |> group()
+        |> pivot(rowKey: ["_time"], columnKey: ["_field"],
+                 valueColumn: "_value")
+        |> sort(columns: ["_time"])
+    '''
+
+    try:
+        with metrics.stage("query"):
+            result = with_retry(query_api.query_data_frame, query)
+        if isinstance(result, list):
+            result = pd.concat(result, ignore_index=True)
+        if not result.empty and "_time" in result.columns:
+            df = result[["_time"] + [f for f in fields
+                                     if f in result.columns]].copy()
+            df["_time"] = pd.to_datetime(df["_time"])
+            for field in fields:
+                if field in df.columns:
+                    df[field] = pd.to_numeric(df[field], errors='coerce')
+            return df.sort_values("_time").reset_index(drop=True)
+        print("[INFO] Ez dira datuak aurkitu.")
+    except Exception as e:
+        metrics.inc("influx_errors_total", operation="query")
+        print(f'[ERROREA]: Akatsa InfluxDB kontsultatzean: {e}')
+    return pd.DataFrame(columns=["_time"] + fields)
+
+
+def query_probe(query_api, bucket, field, start, fn):
+    # Kontsulta merkea eremu baten gainean: fn "last" (azken puntuaren
+    # timestamp-a) edo "count" (start-etik aurrerako puntu kopurua).
+    measurement = MEASUREMENT
+    line = line_condition()
+    query = f'''
+    from(bucket: "{bucket}")
+        |> range(start: {start})
+        |> filter(fn: (r) => r["_measurement"] == "{measurement}"{line})
+        |> filter(fn: (r) => r["_field"] == "{field}")
+        |> {fn}()
+    '''
+
+    try:
+        with metrics.stage("probe"):
+            result = with_retry(query_api.query_data_frame, query)
+        if isinstance(result, list):
+            result = pd.concat(result, ignore_index=True)
+        if result.empty:
+            return None if fn == "last" else 0
+        if fn == "last":
+            return pd.to_datetime(result["_time"]).max()
+        return int(result["_value"].sum())
+    except Exception as e:
+        metrics.inc("influx_errors_total", operation="probe")
+        print(f'[ERROREA]: Akatsa InfluxDB kontsultatzean: {e}')
+    return None if fn == "last" else 0
+
+
+def flux_time(ts):
+    return f'time(v: "{ts.strftime("%Y-%m-%dT%H:%M:%S.%fZ")}")'
+
+
+def align_pivot(df):
+    # Sareta-puntu batean lagina ez duten eremuek aurreko balioa hartzen dute.
+    if df.empty:
+        return pd.DataFrame()
+    df = df.ffill().dropna().reset_index(drop=True)
+    return df if not df.empty else pd.DataFrame()
+
+
+def merge_fields(dataframes):
+    with metrics.stage("merge"):
+        return combine_fields(dataframes)
+
+
+def combine_fields(dataframes):
+    # merge_asof nearest (lehenetsia), edo ALIGN_PERIOD_MS > 0 bada sareta
+    # finko batean lerrokatuta (common.alignment).
+    if alignment.ALIGN_PERIOD_MS > 0:
+        return alignment.align_frames(dataframes)
+    merged_df = None
+    for field, df in dataframes.items():
+        if df.empty:
+            continue
+        if merged_df is None:
+            merged_df = df
+        else:
+            merged_df = pd.merge_asof(
+                merged_df.sort_values("_time"),
+                df.sort_values("_time"),
+                on="_time",
+                direction="nearest"
+            )
+
+    return (merged_df if merged_df is not None
+            and not merged_df.empty else pd.DataFrame())
+
+
+def get_data(bucket, client, fields, window, mode=None):
+    # Datuak lortzeko objetua hasiarazi.
+    query_api = client.query_api()
+    if (mode or QUERY_MODE) == "pivot":
+        return align_pivot(query_pivot(query_api, bucket, fields,
+                                       f"-{window}s", PIVOT_EVERY))
+    dataframes = {field: query_field(query_api, bucket, field, f"-{window}s")
+                  for field in fields}
+    return merge_fields(dataframes)
+
+
+class WindowBuffer:
+    """Eremu bakoitzaren azken `window` segunduak memorian.
+
+    Ziklo bakoitzean azken ikusitako puntutik aurrera bakarrik kontsultatzen
+    da (`overlap` segundu atzerago, Telegraf-en atzerapenak harrapatzeko),
+    eta leihotik kanpo geratzen diren laginak kentzen dira. "pivot" moduan
+    eremu guztiek frame bakarra osatzen dute, zerbitzarian lerrokatuta.
+    """
+
+    def __init__(self, fields, window, overlap=QUERY_OVERLAP,
+                 mode=QUERY_MODE):
+        self.fields = fields
+        self.mode = mode
+        self.window = pd.Timedelta(seconds=window)
+        self.overlap = pd.Timedelta(seconds=overlap)
+        keys = ["pivot"] if mode == "pivot" else fields
+        self.frames = {key: pd.DataFrame() for key in keys}
+        self.last_seen = {key: None for key in keys}
+
+    def fetch(self, query_api, bucket, key, start):
+        if self.mode == "pivot":
+            return query_pivot(query_api, bucket, self.fields, start,
+                               PIVOT_EVERY)
+        return query_field(query_api, bucket, key, start)
+
+    def update(self, bucket, client):
+        query_api = client.query_api()
+        horizon = pd.Timestamp.now(tz="UTC") - self.window
+        for key, old in self.frames.items():
+            last = self.last_seen[key]
+            if last is None or last < horizon:
+                start = f"-{int(self.window.total_seconds())}s"
+            else:
+                since = (last - self.overlap).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                start = f'time(v: "{since}")'
+            new = self.fetch(query_api, bucket, key, start)
+            df = new if old.empty else (old if new.empty else pd.concat(
+                [old, new], ignore_index=True))
+            if not df.empty:
+                df = (df.drop_duplicates("_time", keep="last")
+                      .sort_values("_time"))
+                df = df[df["_time"] >= horizon].reset_index(drop=True)
+                self.last_seen[key] = (df["_time"].iloc[-1]
+                                       if not df.empty else None)
+            self.frames[key] = df
+        if self.mode == "pivot":
+            return align_pivot(self.frames["pivot"])
+        return merge_fields(self.frames)
+
+    def view(self, fields=None, seconds=None):
+        # Leihoaren zatia: eremu eta azken segundo kopuru jakin batera mugatua
+        frames = self.frames
+        if seconds is not None:
+            horizon = pd.Timestamp.now(tz="UTC") - pd.Timedelta(
+                seconds=seconds)
+            frames = {key: df[df["_time"] >= horizon]
+                      for key, df in frames.items() if not df.empty}
+        if fields is None:
+            return frames
+        if self.mode == "pivot":
+            return {key: df[["_time"] + [f for f in fields
+                                         if f in df.columns]]
+                    for key, df in frames.items()}
+        return {key: df for key, df in frames.items() if key in fields}
+
+
+class InfluxSource:
+    """Detektagailu baten leihoa zuzenean InfluxDB-tik."""
+
+    def __init__(self, client, bucket, fields, window):
+        self.client = client
+        self.bucket = bucket
+        self.fields = fields
+        self.window = window
+        self.buffer = WindowBuffer(fields, window)
+
+    def read(self):
+        if INCREMENTAL:
+            return self.buffer.update(self.bucket, self.client)
+        return get_data(self.bucket, self.client, self.fields, self.window)
+
+
+class RemoteSource:
+    """Detektagailu baten leihoa ingest zerbitzuaren cache partekatutik."""
+
+    def __init__(self, url, fields, window, timeout=30):
+        self.url = url.rstrip("/")
+        self.fields = fields
+        self.window = window
+        self.timeout = timeout
+
+    def fetch(self):
+        query = (f"{self.url}/window?fields={','.join(self.fields)}"
+                 f"&seconds={self.window}")
+        with urllib.request.urlopen(query, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def read(self):
+        try:
+            with metrics.stage("query"):
+                payload = with_retry(self.fetch)
+        except Exception as e:
+            metrics.inc("influx_errors_total", operation="ingest")
+            print(f'[ERROREA]: Akatsa ingest zerbitzua kontsultatzean: {e}')
+            return pd.DataFrame()
+        frames = {key: decode_frame(frame)
+                  for key, frame in payload["frames"].items()}
+        if payload["mode"] == "pivot":
+            return align_pivot(frames.get("pivot", pd.DataFrame()))
+        return merge_fields(frames)
+
+
+def make_source(client, bucket, fields, window):
+    # Detektagailuaren leihoa: broker-etik (INGEST_MODE=mqtt), ingest
+    # zerbitzuaren cache-tik (INGEST_URL) edo zuzenean InfluxDB-tik.
+    if INGEST_MODE == "mqtt":
+        # paho behar duten zerbitzuek bakarrik inportatu.
+        from common import stream
+        return stream.MqttSource(fields, window)
+    if INGEST_URL:
+        return RemoteSource(INGEST_URL, fields, window)
+    return InfluxSource(client, bucket, fields, window)
+
+
+def encode_frame(df):
+    # DataFrame -> JSON: _time int64 ns moduan, gainerako zutabeak float.
+    if df.empty:
+        return {}
+    frame = {"_time": pd.DatetimeIndex(df["_time"]).as_unit("ns")
+             .asi8.tolist()}
+    for column in df.columns:
+        if column != "_time":
+            frame[column] = df[column].astype(float).tolist()
+    return frame
+
+
+def decode_frame(frame):
+    if not frame:
+        return pd.DataFrame()
+    df = pd.DataFrame(frame)
+    df["_time"] = pd.to_datetime(df["_time"], unit="ns", utc=True)
+    return df
+
+
+class SharedWindow:
+    """Eremu guztien leiho partekatua, ingest zerbitzuak erabiltzen duena.
+
+    Eskaera bat iristean cache-a `max_age` segundo baino zaharragoa bada,
+    InfluxDB behin kontsultatzen da (blokeo baten pean), beraz aldi
+    berean eskatzen duten detektagailuek kontsulta bera partekatzen dute.
+    """
+
+    def __init__(self, client, bucket, fields, window, max_age=2):
+        self.client = client
+        self.bucket = bucket
+        self.buffer = WindowBuffer(fields, window)
+        self.max_age = max_age
+        self.updated = None
+        self.lock = threading.Lock()
+
+    def snapshot(self, fields=None, seconds=None):
+        with self.lock:
+            now = time.monotonic()
+            if self.updated is None or now - self.updated >= self.max_age:
+                self.buffer.update(self.bucket, self.client)
+                self.updated = now
+            frames = self.buffer.view(fields, seconds)
+            return {"mode": self.buffer.mode,
+                    "frames": {key: encode_frame(df)
+                               for key, df in frames.items()}}
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+RF seinale eratorrien kalkulu nukleoak, float64 array jarraietan.
+
+transitions detektagailuak eta lineaz kanpoko analisiak (test.py) seinale
+berak kalkulatzen dituzte: ReflectedPower, Adaptation, NoiseForward, bi
+EWMA iragazkiak eta Adaptation iragaziaren malda. pandas zutabeen
+esleipenen ordez (dei bakoitzean tarteko kopia asko), hemen array-ak
+zuzenean erabiltzen dira, eta transition_signals-ek dena pasaera bakarrean
+egiten du:
+
+  - numba instalatuta badago, begizta fusionatu bat (njit) lagin
+    bakoitzeko, tarteko array-rik gabe;
+  - bestela NumPy/SciPy bidez (lfilter), emaitza berarekin.
+
+EWMA-k pandas-en ewm(alpha).mean() (adjust=True) berdin-berdin ematen du,
+NaN-ak barne, eta egoera (pisatutako batura, pisuen batura) itzultzen du
+hurrengo zatiarekin jarraitzeko.
+"""
+
+import numpy as np
+from scipy.signal import lfilter
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# transition_signals-ek itzultzen dituen lerroen ordena.
+SIGNALS = ("ReflectedPower", "Adaptation", "NoiseForward",
+           "Adaptation_filtered", "NoiseForward_filtered")
+
+
+def as_array(values):
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def rf_signals(forward, reflection, incident):
+    # (ReflectedPower, Adaptation, NoiseForward).
+    forward, incident = as_array(forward), as_array(incident)
+    reflected = np.multiply(as_array(reflection), incident)
+    adaptation = np.subtract(forward, reflected)
+    noise = np.subtract(forward, incident)
+    return reflected, adaptation, noise
+
+
+def ewma(values, alpha, state=(0.0, 0.0)):
+    """ewm(alpha).mean() `state`-etik jarraituta: (iragazita, egoera berria).
+
+    S_j = r*S_(j-1) + x_j eta D_j = r*D_(j-1) + 1 (r = 1 - alpha); NaN
+    batek bietan 0 gehitzen du, pandas-en ignore_na=False bezala.
+    """
+    x = as_array(values)
+    if not len(x):
+        return x.copy(), state
+    weighted, weights = state
+    r = 1.0 - alpha
+    valid = ~np.isnan(x)
+    S, _ = lfilter([1.0], [1.0, -r], np.where(valid, x, 0.0),
+                   zi=[r * weighted])
+    D, _ = lfilter([1.0], [1.0, -r], valid.astype(np.float64),
+                   zi=[r * weights])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        filtered = np.where(D > 0, S / D, np.nan)
+    return filtered, (S[-1], D[-1])
+
+
+def slope(x, y):
+    # scipy.stats.linregress(x, y).slope, erdiratutako baturekin.
+    x, y = as_array(x), as_array(y)
+    xc = x - x.mean()
+    return np.dot(xc, y - y.mean()) / np.dot(xc, xc)
+
+
+def _fused_loop(forward, reflection, incident, alpha_a, alpha_n, state,
+                out):
+    # Lagin bakoitzean seinale guztiak eta bi iragazkiak; state lekuan
+    # eguneratzen da (Sa, Da, Sn, Dn).
+    ra = 1.0 - alpha_a
+    rn = 1.0 - alpha_n
+    sa, da, sn, dn = state[0], state[1], state[2], state[3]
+    for j in range(forward.shape[0]):
+        reflected = reflection[j] * incident[j]
+        adaptation = forward[j] - reflected
+        noise = forward[j] - incident[j]
+        sa *= ra
+        da *= ra
+        if adaptation == adaptation:
+            sa += adaptation
+            da += 1.0
+        sn *= rn
+        dn *= rn
+        if noise == noise:
+            sn += noise
+            dn += 1.0
+        out[0, j] = reflected
+        out[1, j] = adaptation
+        out[2, j] = noise
+        out[3, j] = sa / da if da > 0.0 else np.nan
+        out[4, j] = sn / dn if dn > 0.0 else np.nan
+    state[0], state[1], state[2], state[3] = sa, da, sn, dn
+
+
+fused_loop = (numba.njit(cache=True, nogil=True)(_fused_loop)
+              if numba is not None else None)
+
+
+def transition_signals(forward, reflection, incident, alpha_adaptation,
+                       alpha_noise, state=None):
+    """SIGNALS ordenako (5, n) array-a eta egoera berria.
+
+    `state` aurreko deiaren egoera da ((Sa, Da), (Sn, Dn)); None bada
+    iragazkiak hasieratik hasten dira.
+    """
+    forward = as_array(forward)
+    reflection, incident = as_array(reflection), as_array(incident)
+    if state is None:
+        state = ((0.0, 0.0), (0.0, 0.0))
+    if fused_loop is not None:
+        out = np.empty((len(SIGNALS), len(forward)))
+        flat = np.array(state[0] + state[1], dtype=np.float64)
+        fused_loop(forward, reflection, incident, alpha_adaptation,
+                   alpha_noise, flat, out)
+        return out, ((flat[0], flat[1]), (flat[2], flat[3]))
+    reflected, adaptation, noise = rf_signals(forward, reflection, incident)
+    adaptation_f, adaptation_state = ewma(adaptation, alpha_adaptation,
+                                          state[0])
+    noise_f, noise_state = ewma(noise, alpha_noise, state[1])
+    out = np.stack((reflected, adaptation, noise, adaptation_f, noise_f))
+    return out, (adaptation_state, noise_state)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+faults eta transitions detektagailuen ziklo begizta partekatua.
+
+Ziklo bakoitzean iturriaren leihoa irakurri (source.read()) eta datuak
+badaude detektagailuaren urratsa exekutatzen da (step(df)). Begiztak
+neurtzen ditu irakurketa, leihoko lerroak, zikloaren iraupena eta
+`cycle` gainditu duten zikloak (common.metrics); hurrengo zikloa noiz hasi
+trigger-ek erabakitzen du (common.trigger).
+"""
+
+import time
+
+from common import metrics
+from common import trigger as triggers
+
+
+def run(source, step, cycle, clock=time, until=None, trigger=None):
+    # `cycle`: detekzio zikloen arteko tartea (s), detektagailu bakoitzaren
+    # CYCLE_SECONDS. INGEST_MODE=mqtt denean leihoa memorian dago eta tarte
+    # laburragoak erabil daitezke.
+    # `clock`-ek time() eta sleep() ditu: produkzioan time modulua, eta
+    # grabatutako datuekin erloju birtual bat (until ezarrita badago,
+    # clock.time() hortik pasatzean amaitzen da). `trigger`-ek erabakitzen
+    # du hurrengo zikloa noiz hasi (lehenetsia: `cycle` segundoro).
+    trigger = trigger or triggers.IntervalTrigger(cycle, clock)
+    while until is None or clock.time() <= until:
+        start_time = clock.time()
+        with metrics.stage("read"):
+            df = source.read()
+        if df.empty:
+            print("[INFO] Ez dago daturik. Itxaroten...")
+            trigger.wait()
+            continue
+        metrics.inc("detector_points_processed_total", len(df))
+        metrics.set_gauge("detector_cycle_points", len(df))
+        step(df)
+        elapsed = clock.time() - start_time
+        metrics.observe("detector_stage_seconds", elapsed, stage="cycle")
+        if elapsed > cycle:
+            metrics.inc("detector_cycle_overruns_total")
+        trigger.wait(elapsed)
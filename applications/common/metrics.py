@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Detektagailuen metrikak Prometheus testu formatuan (liburutegi estandarra).
+
+Prozesu bakoitzak erregistro bakarra du: kontagailuak, gauge-ak eta
+histogramak, etiketekin. serve()-k HTTP zerbitzari bat abiarazten du
+hari batean (GET /metrics), eta Prometheus-ek hortik irakurtzen ditu.
+Neurtzen dena:
+
+  - detector_stage_seconds{stage}: kontsulta, lerrokatzea, DBSCAN talde
+    bakoitza, seinaleak, detekzioa, idazketa eta ziklo osoa;
+  - detector_points_processed_total / detector_cycle_points: leihoko
+    lerroak;
+  - detector_anomalies_written_total, detector_transitions_total;
+  - detector_cycle_overruns_total: CYCLE_SECONDS gainditu duten zikloak;
+  - influx_errors_total{operation}: InfluxDB kontsulta eta idazketa akatsak.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 0 bada ez da HTTP zerbitzaririk abiarazten.
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))
+# Etapen iraupen histogramen mugak (s), 15 s-ko zikloraino.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+           10.0, 15.0, 30.0)
+
+HELP = {
+    "detector_stage_seconds": "Detekzio etapa bakoitzaren iraupena (s).",
+    "detector_points_processed_total": "Prozesatutako leihoko lerroak.",
+    "detector_cycle_points": "Azken zikloko leihoaren lerro kopurua.",
+    "detector_anomalies_written_total": "InfluxDB-ra bidalitako anomaliak.",
+    "detector_transitions_total": "Detektatutako trantsizioak.",
+    "detector_cycle_overruns_total": "Zikloaren tartea gainditu dutenak.",
+    "influx_errors_total": "InfluxDB kontsulta eta idazketa akatsak.",
+    "points_written_total": "InfluxDB-ra bidalitako puntuak.",
+}
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+class Registry:
+    """Metriken erregistroa; metodo guztiak hari-seguruak dira."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            key = label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges.setdefault(name, {})[label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            key = label_key(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for kind, metrics in (("counter", self.counters),
+                                  ("gauge", self.gauges)):
+                for name, series in sorted(metrics.items()):
+                    lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{name}{format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(series.items()):
+                    total = 0
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        total += count
+                        lines.append(f"{name}_bucket"
+                                     f"{format_labels(key, [('le', bound)])}"
+                                     f" {total}")
+                    lines.append(f"{name}_bucket"
+                                 f"{format_labels(key, [('le', '+Inf')])}"
+                                 f" {hist.count}")
+                    lines.append(f"{name}_sum{format_labels(key)} "
+                                 f"{hist.sum}")
+                    lines.append(f"{name}_count{format_labels(key)} "
+                                 f"{hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+set_gauge = registry.set
+
+
+@contextmanager
+def stage(name):
+    # with metrics.stage("query"): ... -> detector_stage_seconds{stage=...}
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("detector_stage_seconds", time.perf_counter() - t0,
+                stage=name)
+
+
+def timed(func, *args):
+    # (emaitza, segundoak): beste prozesu batean exekutatzen diren
+    # etapentzat, iraupena prozesu nagusiko erregistroan gordetzeko.
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def make_handler(registry):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=METRICS_PORT):
+    # /metrics atzeko planoko hari batean; port 0 bada ezer ez.
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("", port), make_handler(registry))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[INFO] Metrikak {port} atakan: /metrics.")
+    return server
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Detektagailuen leihoak zuzenean MQTT-tik (InfluxDB-ra joan-etorririk gabe).
+
+Simulatzaileak publikatzen dituen topic-etara (sensor/<izena> lagin bakarra,
+sensor/batch objektuen array-a) harpidetzen da eta eremu bakoitzaren azken
+`window` segunduak memorian gordetzen ditu. InfluxDB emaitzak gordetzeko
+bakarrik erabiltzen da; Telegraf-ek jarraitzen du datu gordinak idazten.
+MqttTrigger-ek iturriaren harpidetza bera erabiltzen du (listeners), beraz
+detektagailu bakoitzak konexio bakarra du eta mezu bakoitza behin
+deskodetzen da.
+"""
+
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import paho.mqtt.client as mqtt
+
+from common import influx, trigger
+
+MQTT_BROKER = os.getenv("MQTT_BROKER_HOST", "mqtt_broker")
+MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+# Simulatzaile bat baino gehiago (REPLAY_LINES) badago, lerro bakarrera
+# mugatu: adib. "sensor/line0/#".
+MQTT_TOPIC = os.getenv("MQTT_TOPIC", "sensor/#")
+
+
+class MqttSource:
+    """Detektagailu baten leihoa MQTT harpidetza batetik.
+
+    paho-ren haritik iristen diren laginak eremu bakoitzeko zerrendetan
+    pilatzen dira (string eta float gordinak), eta read() deitzean bihurtzen
+    dira DataFrame-etara behin, denbora guztiak batera parseatuz. Leihoa
+    ikusitako azken timestamp-arekiko mozten da, ez erloju errealarekiko,
+    simulatzailearen erloju sintetikoarekin ere balio dezan. Mezu bakoitzaren
+    ondoren `listeners`-ei deitzen zaie {eremua: lagin berriak} hiztegiarekin
+    (paho-ren haritik).
+    """
+
+    def __init__(self, fields, window, host=MQTT_BROKER, port=MQTT_PORT,
+                 topic=MQTT_TOPIC, buffer=True):
+        self.fields = fields
+        # False bada laginak zenbatu eta listeners-ei pasatu bakarrik
+        # (read() deitzen ez denean, adib. MqttTrigger-en iturri gisa).
+        self.buffer = buffer
+        self.window = pd.Timedelta(seconds=window)
+        self.topic = topic
+        self.frames = {field: pd.DataFrame() for field in fields}
+        self.pending = {field: ([], []) for field in fields}
+        self.received = 0
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.client = mqtt.Client()
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.connect(host, port)
+        self.client.loop_start()
+
+    def on_connect(self, client, userdata, flags, rc):
+        # Berriro konektatzean ere harpidetza berritu.
+        if rc == 0:
+            print(f"[INFO] MQTT Broker-era konektatuta, '{self.topic}' "
+                  "entzuten.")
+            client.subscribe(self.topic)
+        else:
+            print(f"[ERROR] MQTT Broker-era konektatzean arazoa, kodea: {rc}")
+
+    def on_message(self, client, userdata, msg):
+        try:
+            payload = json.loads(msg.payload)
+        except ValueError:
+            return
+        self.add(payload if isinstance(payload, list) else [payload])
+
+    def add(self, samples):
+        added = {}
+        with self.lock:
+            for sample in samples:
+                if not isinstance(sample, dict) or "time" not in sample:
+                    continue
+                for field, value in sample.items():
+                    if field in self.pending:
+                        if self.buffer:
+                            times, values = self.pending[field]
+                            times.append(sample["time"])
+                            values.append(value)
+                        added[field] = added.get(field, 0) + 1
+            self.received += sum(added.values())
+        if added:
+            for listener in self.listeners:
+                listener(added)
+
+    def read(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = {field: ([], []) for field in self.fields}
+        last = None
+        for field, (times, values) in pending.items():
+            df = self.frames[field]
+            if times:
+                new = pd.DataFrame({
+                    "_time": pd.to_datetime(times, utc=True,
+                                            format="ISO8601"),
+                    field: pd.to_numeric(values, errors="coerce")})
+                new = new.dropna()
+                df = new if df.empty else pd.concat([df, new],
+                                                    ignore_index=True)
+                df = (df.drop_duplicates("_time", keep="last")
+                      .sort_values("_time").reset_index(drop=True))
+            self.frames[field] = df
+            if not df.empty:
+                last = (df["_time"].iloc[-1] if last is None
+                        else max(last, df["_time"].iloc[-1]))
+        if last is None:
+            return pd.DataFrame()
+        horizon = last - self.window
+        for field, df in self.frames.items():
+            if not df.empty and df["_time"].iloc[0] < horizon:
+                self.frames[field] = df[df["_time"] >= horizon].reset_index(
+                    drop=True)
+        return influx.merge_fields(self.frames)
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+class MqttTrigger:
+    """Zikloa `field` eremuaren min_points lagin berri iristean askatu.
+
+    MqttSource-ren harpidetzak laginak zenbatzen ditu (paho-ren haritik) eta
+    wait() Condition baten zain geratzen da, kontsultarik egin gabe. Laginen
+    bat badago baina min_points-era iritsi gabe, max_wait segundoren buruan
+    ere askatzen da.
+    """
+
+    def __init__(self, source, field, min_points=trigger.TRIGGER_MIN_POINTS,
+                 max_wait=trigger.TRIGGER_MAX_WAIT):
+        self.field = field
+        self.min_points = min_points
+        self.max_wait = max_wait
+        self.count = 0
+        self.condition = threading.Condition()
+        source.listeners.append(self.on_samples)
+
+    def on_samples(self, added):
+        new = added.get(self.field, 0)
+        if new:
+            with self.condition:
+                self.count += new
+                self.condition.notify_all()
+
+    def wait(self, elapsed=0):
+        deadline = time.monotonic() + self.max_wait
+        with self.condition:
+            while self.count < self.min_points:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 and self.count:
+                    break
+                self.condition.wait(remaining if remaining > 0 else None)
+            self.count = 0
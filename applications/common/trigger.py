@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Detekzio zikloak noiz exekutatu: tarte finkoz edo datu berriak iristean.
+
+TRIGGER_MODE:
+  - "interval": orain arteko portaera, CYCLE_SECONDS-ero (lehenetsia);
+  - "probe": TRIGGER_POLL_SECONDS-ero eremu baten azken timestamp-a
+    kontsultatzen da InfluxDB-n (last(), oso merkea); aurrera egin badu,
+    puntu berriak zenbatzen dira (count()) eta TRIGGER_MIN_POINTS
+    iristean zikloa exekutatzen da;
+  - "mqtt": iturriaren MQTT harpidetzak eremuaren laginak zenbatzen ditu
+    (common.stream.MqttTrigger); itxaroten den bitartean ez dago
+    kontsultarik.
+
+"probe" moduan, datu berririk ez dagoen bitartean probaketen arteko
+tartea bikoizten da (TRIGGER_POLL_SECONDS-etik zikloaren luzeraraino) eta
+azken timestamp-a aldatzean hasierara itzultzen da.
+
+Datu berriren bat badago baina TRIGGER_MIN_POINTS-era iritsi gabe,
+TRIGGER_MAX_WAIT segundo igarotakoan ere exekutatzen da. Datu sorta
+handiak berehala prozesatzen dira: zikloa bukatzean baldintza dagoeneko
+betetzen bada, ez da itxaroten.
+"""
+
+import os
+import time
+
+import pandas as pd
+
+from common import influx
+
+TRIGGER_MODE = os.getenv("TRIGGER_MODE", "interval")
+TRIGGER_MIN_POINTS = int(os.getenv("TRIGGER_MIN_POINTS", 50))
+TRIGGER_POLL_SECONDS = float(os.getenv("TRIGGER_POLL_SECONDS", 1))
+TRIGGER_MAX_WAIT = float(os.getenv("TRIGGER_MAX_WAIT", 60))
+
+
+class IntervalTrigger:
+    """Zikloaren hasieratik `cycle` segundo igaro arte itxaron."""
+
+    def __init__(self, cycle, clock=time):
+        self.cycle = cycle
+        self.clock = clock
+
+    def wait(self, elapsed=0):
+        self.clock.sleep(max(0, self.cycle - elapsed))
+
+
+class ProbeTrigger:
+    """Eremu baten puntu berriak InfluxDB-n, last() eta count() bidez."""
+
+    def __init__(self, client, bucket, field, window, cycle,
+                 min_points=TRIGGER_MIN_POINTS, poll=TRIGGER_POLL_SECONDS,
+                 max_wait=TRIGGER_MAX_WAIT, clock=time):
+        self.client = client
+        self.bucket = bucket
+        self.field = field
+        self.window = window
+        # Geldirik dagoenean probaketen arteko gehieneko tartea.
+        self.cycle = max(cycle, poll)
+        self.min_points = min_points
+        self.poll = poll
+        self.max_wait = max_wait
+        self.clock = clock
+        # Azken zikloa exekutatu zenean ikusitako azken timestamp-a.
+        self.since = None
+
+    def wait(self, elapsed=0):
+        query_api = self.client.query_api()
+        started = self.clock.time()
+        delay = self.poll
+        seen = self.since
+        while True:
+            newest = influx.query_probe(query_api, self.bucket, self.field,
+                                        f"-{self.window}s", "last")
+            changed = newest is not None and newest != seen
+            if changed:
+                seen = newest
+                delay = self.poll
+            if newest is not None and self.since is None:
+                # Lehen probaketa: hemendik aurrerakoak zenbatu.
+                self.since = newest
+            elif newest is not None and newest > self.since:
+                start = influx.flux_time(self.since
+                                         + pd.Timedelta(microseconds=1))
+                count = influx.query_probe(query_api, self.bucket,
+                                           self.field, start, "count")
+                if (count >= self.min_points
+                        or self.clock.time() - started >= self.max_wait):
+                    self.since = newest
+                    return
+            self.clock.sleep(delay)
+            if not changed:
+                # Ezer berririk ez: hurrengo probaketa beranduago.
+                delay = min(2 * delay, self.cycle)
+
+
+def make_trigger(client, bucket, field, window, cycle, mode=None,
+                 source=None):
+    mode = mode or TRIGGER_MODE
+    if mode == "probe":
+        return ProbeTrigger(client, bucket, field, window, cycle)
+    if mode == "mqtt":
+        # paho behar duten zerbitzuek bakarrik inportatu.
+        from common import stream
+        # Detektagailuaren MqttSource-ren harpidetza berrerabili; iturria
+        # beste bat bada (INGEST_MODE=influx), laginak zenbatzeko bakarrik
+        # ireki.
+        if not isinstance(source, stream.MqttSource):
+            source = stream.MqttSource([field], window, buffer=False)
+        return stream.MqttTrigger(source, field)
+    return IntervalTrigger(cycle)
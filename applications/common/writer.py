@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Detektagailuen emaitzak InfluxDB-n idazteko sortaka eta asinkronoki.
+
+Puntuak ez dira banan-banan bidaltzen: DataFrame osoa line protocol-era
+bihurtzen da bektorialki eta WriteApi-ren batching moduak atzeko planoan
+bidaltzen ditu, WRITE_BATCH_SIZE puntuko sortetan edo WRITE_FLUSH_INTERVAL
+ms-ro. Leiho gainjarriak direla eta, aurreko zikloetan idatzitako
+(etiketa, timestamp) bikoteak ez dira berriro idazten.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from influxdb_client import WriteOptions
+
+from common import metrics
+
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 1000))
+WRITE_FLUSH_INTERVAL = int(os.getenv("WRITE_FLUSH_INTERVAL", 1000))
+
+
+def write_error(conf, data, exception):
+    # Atzeko planoko sorta batek huts egin du (berrsaiakerak agortuta).
+    metrics.inc("influx_errors_total", operation="write")
+    print(f'[ERROR] Sorta bat ezin izan da InfluxDB-n idatzi: {exception}')
+
+
+def write_api(client):
+    # Batching WriteApi: `with` blokea ixtean geratzen diren puntuak bidali.
+    return client.write_api(write_options=WriteOptions(
+        batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL),
+        error_callback=write_error)
+
+
+class PointWriter:
+    """Neurketa baten puntuak, leiho gainjarrien bikoiztuak kenduta.
+
+    `tag` zutabearen balio bakoitzeko idatzitako timestamp-ak (int64 ns)
+    gordetzen dira, eta idatzitako azkenetik `horizon` segundo baino
+    zaharragoak ahazten dira: horiek ez dira berriro leihoan agertuko.
+    """
+
+    def __init__(self, write_api, bucket, measurement, tag=None,
+                 horizon=None):
+        self.write_api = write_api
+        self.bucket = bucket
+        self.measurement = measurement
+        self.tag = tag
+        self.horizon = (None if horizon is None
+                        else int(pd.Timedelta(seconds=horizon).value))
+        self.written = {}
+
+    def fresh(self, key, times):
+        # times-etik oraindik idatzi gabeak (maskara boolearra).
+        seen = self.written.get(key)
+        if seen is None:
+            return np.ones(len(times), dtype=bool)
+        return ~np.isin(times, seen)
+
+    def remember(self, key, times):
+        seen = np.union1d(self.written.get(key, np.empty(0, np.int64)),
+                          times)
+        if self.horizon is not None and len(seen):
+            seen = seen[seen >= seen[-1] - self.horizon]
+        self.written[key] = seen
+
+    def write(self, df, fields):
+        # df: "_time" zutabea, `fields` eremuak eta (badago) `tag` zutabea.
+        # Idatzitako puntu kopurua itzultzen du.
+        if df.empty:
+            return 0
+        with metrics.stage("write"):
+            count = self.write_groups(df, fields)
+        metrics.inc("points_written_total", count,
+                    measurement=self.measurement)
+        return count
+
+    def write_groups(self, df, fields):
+        groups = (df.groupby(self.tag, sort=False) if self.tag
+                  else [(None, df)])
+        count = 0
+        for key, group in groups:
+            times = pd.DatetimeIndex(group["_time"]).as_unit("ns").asi8
+            mask = self.fresh(key, times)
+            if not mask.any():
+                continue
+            columns = [c for c in fields if c in group.columns
+                       and group[c].notna().any()]
+            points = group.loc[mask, ["_time"] + columns].copy()
+            if self.tag:
+                points[self.tag] = key
+            points = points.set_index("_time")
+            try:
+                self.write_api.write(
+                    bucket=self.bucket, record=points,
+                    data_frame_measurement_name=self.measurement,
+                    data_frame_tag_columns=[self.tag] if self.tag else [])
+            except Exception as e:
+                metrics.inc("influx_errors_total", operation="write")
+                print(f'[ERROR] Ezin izan dira puntuak InfluxDB-n idatzi: '
+                      f'{e}')
+                continue
+            self.remember(key, times[mask])
+            count += int(mask.sum())
+        return count
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+DBSCAN zehatza aldagai bakarreko datuentzat (CameraLuminosity).
+
+Dimentsio batean eps auzoak tarte jarraituak dira balioen ordenan, beraz
+sklearn-en zuhaitz bilaketa ordenatze bat eta searchsorted bihurtzen da:
+O(n log n), eta memoria n-ren proportzionala. Etiketak DBSCAN(eps,
+min_samples).fit_predict()-renak dira berdin-berdin:
+
+  - auzokidea: (a - x)**2 <= eps**2, sklearn-en zuhaitzek bezala;
+  - core puntuen osagaiak ordenan ondoz ondoko core-en arteko jauziek
+    mozten dituzte, eta klusterren zenbakiak osagaiaren jatorrizko
+    indize txikienaren ordenan ematen dira (sklearn-ek ordena horretan
+    hedatzen ditu);
+  - muga puntu batek ukitzen duen klusterrik txikiena hartzen du (ezker
+    eta eskuineko core hurbilenak bakarrik izan daitezke auzoan).
+"""
+
+import numpy as np
+
+
+def within(a, b, eps2):
+    return (a - b) ** 2 <= eps2
+
+
+def neighbour_bounds(s, eps):
+    # s ordenatuta: i. puntuaren auzoa s[lo[i]:hi[i]] da.
+    eps2 = eps * eps
+    n = len(s)
+    lo = np.searchsorted(s, s - eps, "left")
+    hi = np.searchsorted(s, s + eps, "right")
+    # Koma mugikorreko biribiltzeak: mugak predikatu zehatzera zuzendu.
+    while True:
+        down = (lo > 0) & within(s[np.maximum(lo - 1, 0)], s, eps2)
+        up = ~within(s[np.minimum(lo, n - 1)], s, eps2)
+        if not (down.any() or up.any()):
+            break
+        lo = lo - down + up
+    while True:
+        grow = (hi < n) & within(s[np.minimum(hi, n - 1)], s, eps2)
+        shrink = ~within(s[hi - 1], s, eps2)
+        if not (grow.any() or shrink.any()):
+            break
+        hi = hi + grow - shrink
+    return lo, hi
+
+
+def dbscan_1d(x, eps, min_samples):
+    """sklearn.cluster.DBSCAN(eps, min_samples).fit_predict(x[:, None])."""
+    x = np.asarray(x, dtype=np.float64).reshape(-1)
+    n = len(x)
+    labels = np.full(n, -1, dtype=np.int64)
+    if not n:
+        return labels
+    order = np.argsort(x, kind="stable")
+    s = x[order]
+    eps2 = eps * eps
+    lo, hi = neighbour_bounds(s, eps)
+    core = (hi - lo) >= min_samples
+    cores = np.flatnonzero(core)
+    if not len(cores):
+        return labels
+
+    # Core osagaiak ordenan, eta zenbakiak jatorrizko indize txikienaren
+    # arabera.
+    cut = ~within(s[cores[1:]], s[cores[:-1]], eps2)
+    component = np.concatenate(([0], np.cumsum(cut)))
+    starts = np.flatnonzero(np.concatenate(([True], cut)))
+    first = np.minimum.reduceat(order[cores], starts)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind="stable")] = np.arange(len(first))
+    sorted_labels = np.full(n, -1, dtype=np.int64)
+    sorted_labels[cores] = rank[component]
+
+    # Muga puntuak: ezkerreko eta eskuineko core hurbilenak.
+    positions = np.arange(n)
+    left = np.maximum.accumulate(np.where(core, positions, -1))
+    right = np.minimum.accumulate(
+        np.where(core, positions, n)[::-1])[::-1]
+    border = np.flatnonzero(~core)
+    best = np.full(len(border), np.iinfo(np.int64).max)
+    for nearest in (left[border], right[border]):
+        valid = (nearest >= 0) & (nearest < n)
+        idx = np.clip(nearest, 0, n - 1)
+        valid &= within(s[idx], s[border], eps2)
+        best = np.where(valid, np.minimum(best, sorted_labels[idx]), best)
+    sorted_labels[border] = np.where(best == np.iinfo(np.int64).max, -1,
+                                     best)
+
+    labels[order] = sorted_labels
+    return labels
@@ -6,16 +6,21 @@ Created on Thu Jun 10 09:03:46 2025
 """
 
 import numpy as np
-from influxdb_client import InfluxDBClient
 import pandas as pd
 import time
 import os
-from influxdb_client import Point
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import DBSCAN
-import warnings
-from influxdb_client.client.warnings import MissingPivotFunction
-warnings.simplefilter("ignore", MissingPivotFunction)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+from common import influx, loop, metrics, writer  # noqa: E402
+from common import trigger as triggers  # noqa: E402
+from dbscan1d import dbscan_1d  # noqa: E402
+from incremental_dbscan import IncrementalDBSCAN  # noqa: E402
 
 
 # DBSCAN parametroak
@@ -25,78 +30,56 @@ eps_dict = {
     "CameraLuminosity": 0.6
 }
 min_samples = 30
+# "full" (lehenetsia): ziklo bakoitzean StandardScaler + DBSCAN leiho
+# osoan; "incremental": taldeko IncrementalDBSCAN bat zikloz ziklo mantendu
+# (eskala izoztuta, RESCALE_TOL-etik gora aldatzean berriro kalkulatuta).
+# Eskala izoztuak emaitzak aldatzen ditu (ez da "full"-en baliokidea), beraz
+# aukerakoa da. Aldagai bakarreko taldeek beti dbscan_1d erabiltzen dute
+# (zehatza eta azkarragoa).
+dbscan_mode = os.getenv("DBSCAN_MODE", "full")
+rescale_tol = float(os.getenv("RESCALE_TOL", 0.25))
 window = 800
+cycle = float(os.getenv("CYCLE_SECONDS", 15))
+# Taldeak aldi berean ebaluatzeko prozesu kopurua (1: prozesu nagusian,
+# bata bestearen atzetik).
+workers = int(os.getenv("DETECTOR_WORKERS", 1))
 
 # ALDAGAI TALDEAK
 rf_taldea = ["ForwardPower", "ReflectionCoefficientMagnitude",
              "IncidentPowerReference"]
 huts_taldea = ["GasFlow", "PressureLEBT"]
 isolatu_taldea = ["CameraLuminosity"]
+fields = rf_taldea + huts_taldea + isolatu_taldea
+groups = ([(rf_taldea, "rf"), (huts_taldea, "huts")]
+          + [([col], col) for col in isolatu_taldea])
 
 
-def get_data(bucket, client, window):
-    # Datuak lortzeko objetua hasiarazi.
-    query_api = client.query_api()
-    fields = ["ForwardPower", "ReflectionCoefficientMagnitude",
-              "IncidentPowerReference", "GasFlow", "PressureLEBT",
-              "CameraLuminosity"]
-    measurement = "mqtt_consumer"
-    dataframes = {}
-    for field in fields:
-        query = f'''
-        from(bucket: "{bucket}")
-            |> range(start: -{window}s)
-            |> filter(fn: (r) => r["_measurement"] == "{measurement}")
-            |> filter(fn: (r) => r["_field"] == "{field}")
-            |> sort(columns: ["_time"])
-        '''
-
-        try:
-            # Lehen definitutako query-arentzat datuak lortu dataframe moduan.
-            result = query_api.query_data_frame(query)
-            if isinstance(result, list):
-                df = pd.concat(result, ignore_index=True)
-            else:
-                df = result
-
-            if (not df.empty and "_time" in df.columns
-                    and "_value" in df.columns):
-                df = df[["_time", "_value"]].rename(columns={"_value": field})
-
-                df["_time"] = pd.to_datetime(df["_time"])
-                df = df.dropna(subset=["_time"])
-
-                df[field] = pd.to_numeric(df[field], errors='coerce')
-                df = df.dropna(subset=[field])
-                df = df.sort_values("_time").reset_index(drop=True)
-
-                dataframes[field] = df
-            else:
-                print(f"[INFO] Ez dira datuak aurkitu {field} eremurako.")
-                dataframes[field] = pd.DataFrame(columns=["_time", field])
-        except Exception as e:
-            print(f'[ERROREA]: Akatsa InfluxDB kontsultatzean: {e}')
-            dataframes[field] = pd.DataFrame(columns=["_time", field])
-
-    merged_df = None
-    for field, df in dataframes.items():
-        if df.empty:
-            continue
-        if merged_df is None:
-            merged_df = df
+def noise_mask(Xf, columns, eps, engine=None):
+    # DBSCAN-en zarata puntuak (-1 etiketa), leiho osoan edo inkrementalki.
+    if engine is None:
+        X_scaled = StandardScaler().fit_transform(Xf[columns])
+        if len(columns) == 1:
+            labels = dbscan_1d(X_scaled[:, 0], eps, min_samples)
         else:
-            merged_df = pd.merge_asof(
-                merged_df.sort_values("_time"),
-                df.sort_values("_time"),
-                on="_time",
-                direction="nearest"
-            )
+            labels = DBSCAN(eps=eps,
+                            min_samples=min_samples).fit_predict(X_scaled)
+        return labels == -1
+    times = pd.DatetimeIndex(Xf["_time"]).as_unit("ns").asi8
+    return engine.update(times, Xf[columns].to_numpy(dtype=float))
+
+
+def make_engines(eps_dict):
+    # Aldagai anitzeko taldeentzat bakarrik.
+    if dbscan_mode != "incremental":
+        return {}
+    return {name: IncrementalDBSCAN(eps, min_samples, rescale_tol)
+            for name, eps in eps_dict.items() if name.endswith("_taldea")}
 
-    return (merged_df if merged_df is not None
-            and not merged_df.empty else pd.DataFrame())
 
+engines = make_engines(eps_dict)
 
-def dbscan_multi(df, columns, talde, eps):
+
+def dbscan_multi(df, columns, talde, eps, engine=None):
     if not all(col in df.columns for col in columns):
         print(f'[ERROR] DBSCAN egiteko zutabeak falta dira: {columns}')
         return pd.DataFrame()
@@ -106,9 +89,7 @@ def dbscan_multi(df, columns, talde, eps):
         print("[INFO] Ez dago DBSCAN aplikatzeko datu nahikorik.")
         return pd.DataFrame()
     try:
-        X_scaled = StandardScaler().fit_transform(X)
-        labels = DBSCAN(eps=eps, min_samples=min_samples).fit_predict(X_scaled)
-        Xf.loc[:, "anomaly"] = labels == -1
+        Xf.loc[:, "anomaly"] = noise_mask(Xf, columns, eps, engine)
         anomalies = Xf.loc[Xf["anomaly"]].copy()
         if not anomalies.empty:
             anomalies.loc[:, "source"] = f"{talde}_multi"
@@ -122,7 +103,7 @@ def dbscan_multi(df, columns, talde, eps):
         return pd.DataFrame()
 
 
-def dbscan_uni(df, column, eps):
+def dbscan_uni(df, column, eps, engine=None):
     if column not in df.columns:
         print(f'[ERROR] Ez da zutabea existitzen: {column}')
         return pd.DataFrame()
@@ -132,9 +113,7 @@ def dbscan_uni(df, column, eps):
         print("[INFO] Ez dago DBSCAN aplikatzeko datu nahikorik.")
         return pd.DataFrame()
     try:
-        X_scaled = StandardScaler().fit_transform(X)
-        labels = DBSCAN(eps=eps, min_samples=min_samples).fit_predict(X_scaled)
-        Xf.loc[:, "anomaly"] = labels == -1
+        Xf.loc[:, "anomaly"] = noise_mask(Xf, [column], eps, engine)
         anomalies = Xf.loc[Xf["anomaly"]].copy()
         if not anomalies.empty:
             print(f'[INFO] Anomaliak aurkitu dira {column} sentsoreetan.')
@@ -148,55 +127,109 @@ def dbscan_uni(df, column, eps):
         return pd.DataFrame()
 
 
-def save_anomaly(anomalies, write_api):
-    for _, row in anomalies.iterrows():
-        point = (
-            Point("anomalies")
-            .time(row["_time"])
-            .tag("source", row["source"])
-            .field("anomaly", True)
-            )
-        for c in row.index:
-            if c not in ["_time", "source"]:
-                point = point.field(c, float(row[c]))
-        write_api.write(bucket=bucket, record=point)
+def detect_group(df, columns, name):
+    # Talde baten anomaliak. Motor inkrementalak prozesu bakoitzeko
+    # `engines` aldagaian daude, beraz talde bat beti prozesu berera doa.
+    if len(columns) > 1:
+        key = f"{name}_taldea"
+        return dbscan_multi(df, columns, name, eps_dict.get(key),
+                            engines.get(key))
+    return dbscan_uni(df, columns[0], eps_dict.get(columns[0]))
+
+
+def make_pools(groups, workers):
+    # Langile bakarreko pool bat prozesu bakoitzeko: talde bakoitza bere
+    # pool-ean finkatuta (k % workers) egoera zikloz ziklo mantentzeko.
+    if workers <= 1:
+        return []
+    return [ProcessPoolExecutor(max_workers=1)
+            for _ in range(min(workers, len(groups)))]
+
+
+def submit(pools, k, df, columns, name):
+    args = (metrics.timed, detect_group, df[["_time"] + columns], columns,
+            name)
+    pool = pools[k % len(pools)]
+    try:
+        return pool, pool.submit(*args)
+    except BrokenProcessPool:
+        # Langilea zikloen artean hil da.
+        restart_pool(pools, pool)
+        pool = pools[k % len(pools)]
+        return pool, pool.submit(*args)
+
+
+def restart_pool(pools, pool):
+    # Langilea hil bada (OOM, seinalea...) pool-a ez da berriro erabilgarria:
+    # itxi eta berri batekin ordezkatu. Pool bera partekatzen duen beste
+    # talde batek dagoeneko berrabiarazi badu, ez egin ezer.
+    p = pools.index(pool) if pool in pools else None
+    if p is not None:
+        pool.shutdown(wait=False)
+        pools[p] = ProcessPoolExecutor(max_workers=1)
+        print(f'[WARN] {p}. prozesua hil da; berriro abiarazten.')
+
+
+def detect(df, pools):
+    # Talde bakoitzaren iraupena langilean neurtu eta hemen erregistratu.
+    if not pools:
+        timed = [(name, metrics.timed(detect_group, df, columns, name))
+                 for columns, name in groups]
+    else:
+        futures = [(k, columns, name) + submit(pools, k, df, columns, name)
+                   for k, (columns, name) in enumerate(groups)]
+        timed = []
+        for k, columns, name, pool, future in futures:
+            try:
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    # Pool berrian behin berriro saiatu (motor inkrementala
+                    # hutsetik hasiko da).
+                    restart_pool(pools, pool)
+                    result = submit(pools, k, df, columns, name)[1].result()
+                timed.append((name, result))
+            except Exception as e:
+                print(f'[ERROR] Talde baten detekzioak huts egin du: {e}.')
+    results = []
+    for name, (result, seconds) in timed:
+        metrics.observe("detector_stage_seconds", seconds,
+                        stage=f"dbscan_{name}")
+        results.append(result)
+    return results
+
+
+def save_anomaly(anomalies, anomaly_writer):
+    # Iturri bakoitzeko puntuak sorta batean; aurreko leihoan idatzitakoak
+    # ez dira errepikatzen.
+    anomalies = anomalies.assign(anomaly=True)
+    columns = [c for c in anomalies.columns if c not in ["_time", "source"]]
+    written = anomaly_writer.write(anomalies, columns)
+    metrics.inc("detector_anomalies_written_total", written)
+
+
+def run(source, anomaly_writer, pools, clock=time, until=None,
+        trigger=None):
+    def step(df):
+        anomalies = [a for a in detect(df, pools) if not a.empty]
+        if anomalies:
+            print("[INFO] Anomalia detektatuta! Leihoa gorde...")
+            anomaly = pd.concat(anomalies).reset_index(drop=True)
+            save_anomaly(anomaly, anomaly_writer)
+        else:
+            print("[INFO] Ez dago anomaliarik...")
+
+    loop.run(source, step, cycle, clock, until, trigger)
 
 
 if __name__ == "__main__":
-    influx_url = os.getenv("INFLUX_URL")
-    influx_token = os.getenv("INFLUX_TOKEN")
-    organization = os.getenv("ORGANIZATION")
     bucket = os.getenv("BUCKET")
-    with InfluxDBClient(url=influx_url, token=influx_token,
-                        org=organization) as client:
-        write_api = client.write_api()
-        while True:
-            start_time = time.time()
-            df = get_data(bucket, client, window)
-            if not df.empty:
-                anomalies = []
-                for columns, name in [(rf_taldea, "rf"),
-                                      (huts_taldea, "huts")]:
-                    eps = eps_dict.get(f"{name}_taldea")
-                    a = dbscan_multi(df, columns, name, eps)
-                    if not a.empty:
-                        anomalies.append(a)
-                for col in isolatu_taldea:
-                    eps = eps_dict.get(col)
-                    b = dbscan_uni(df, col, eps)
-                    if not b.empty:
-                        anomalies.append(b)
-                if anomalies:
-                    print("[INFO] Anomalia detektatuta! Leihoa gorde...")
-                    anomaly = pd.concat(anomalies).reset_index(drop=True)
-                    save_anomaly(anomaly, write_api)
-                else:
-                    print("[INFO] Ez dago anomaliarik...")
-            else:
-                print("[INFO] Ez dago daturik. Itxaroten...")
-                time.sleep(15)
-                prev_adaptation = None
-                prev_noise = None
-                continue
-            elapsed = time.time()-start_time
-            time.sleep(max(0, 15 - elapsed))
+    with influx.connect() as client, writer.write_api(client) as write_api:
+        anomaly_writer = writer.PointWriter(write_api, bucket, "anomalies",
+                                            tag="source", horizon=window)
+        source = influx.make_source(client, bucket, fields, window)
+        pools = make_pools(groups, workers)
+        metrics.serve()
+        run(source, anomaly_writer, pools,
+            trigger=triggers.make_trigger(client, bucket, fields[0], window,
+                                          cycle, source=source))
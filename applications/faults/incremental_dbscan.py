@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+DBSCAN inkrementala faults detektagailuaren leiho mugikorrarentzat.
+
+Ziklo batetik bestera leihoaren puntu gehienak berdinak dira: berriak
+sartu eta leihotik irtendakoak kendu besterik ez da egiten. Puntu
+bakoitzeko mantentzen da:
+
+    count      eps auzoko puntu kopurua (bera barne)
+    core       count >= min_samples
+    core_nbrs  auzoko core puntu kopurua (bera kanpo)
+
+Puntu bat zarata da (sklearn-en -1 etiketa) core ez bada eta auzoan core
+punturik ez badu; horretarako ez da klusterren konektibitatea behar.
+Auzoak eps aldeko gelaxken sareta batekin bilatzen dira, eta ziklo baten
+kostua aldatutako puntuen eta haien auzoen araberakoa da, ez leihoarena.
+
+Eskalatzea (StandardScaler) izoztuta mantentzen da; leihoaren batez
+bestekoa edo desbideratzea `rescale_tol` baino gehiago aldatzen bada
+dena berriro kalkulatzen da eskala berriarekin.
+"""
+
+import itertools
+
+import numpy as np
+
+# Distantzia matrize bakoitzaren gehienezko tamaina (elementuak).
+BLOCK = 1 << 20
+
+
+def counts(x):
+    return np.rint(x).astype(np.int64)
+
+
+class IncrementalDBSCAN:
+
+    def __init__(self, eps, min_samples, rescale_tol=0.25):
+        self.eps = eps
+        self.min_samples = min_samples
+        self.rescale_tol = rescale_tol
+        self.rebuilds = 0
+        self.reset(1)
+
+    def reset(self, dims, capacity=1024):
+        self.dims = dims
+        self.mean = None
+        self.scale = None
+        self.t = np.zeros(capacity, dtype=np.int64)
+        self.raw = np.zeros((capacity, dims))
+        self.X = np.zeros((capacity, dims))
+        self.cell = np.zeros((capacity, dims), dtype=np.int64)
+        self.live = np.zeros(capacity, dtype=bool)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.core = np.zeros(capacity, dtype=bool)
+        self.core_nbrs = np.zeros(capacity, dtype=np.int64)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.grid = {}
+        self.order = np.empty(0, dtype=np.int64)
+        self.offsets = list(itertools.product((-1, 0, 1), repeat=dims))
+
+    def grow(self, needed):
+        old = len(self.t)
+        capacity = max(2 * old, old + needed)
+        for name in ("t", "raw", "X", "cell", "live", "count", "core",
+                     "core_nbrs"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        self.free.extend(range(capacity - 1, old - 1, -1))
+
+    @staticmethod
+    def clamp(std):
+        return np.where(std > 0, std, 1.0)
+
+    def needs_rescale(self, values):
+        if self.mean is None or values.shape[1] != self.dims:
+            return True
+        mean = values.mean(axis=0)
+        # rebuild()-en bezala mugatuta: aldakuntzarik gabeko zutabeak
+        # (adib. IncidentPowerReference) 1.0 eskala du eta ez du berriro
+        # kalkulatzea behartu behar.
+        std = self.clamp(values.std(axis=0))
+        tol = self.rescale_tol * self.scale
+        return bool(np.any(np.abs(std - self.scale) > tol)
+                    or np.any(np.abs(mean - self.mean) > tol))
+
+    def blocks(self, slots):
+        # (i, candidates, M) zatiak: i slots-en indizeak, candidates auzoko
+        # gelaxketako slot biziak eta M[a, b] = X[slots[i[a]]] eta
+        # X[candidates[b]] eps distantziara edo gertuago badaude (bera barne),
+        # float32 moduan matrize biderketetarako.
+        if not len(slots):
+            return
+        cells, inverse = np.unique(self.cell[slots], axis=0,
+                                   return_inverse=True)
+        inverse = inverse.reshape(-1)
+        eps2 = self.eps * self.eps
+        for c, cell in enumerate(map(tuple, cells)):
+            members = np.flatnonzero(inverse == c)
+            found = [self.grid.get(tuple(a + o for a, o in zip(cell, off)))
+                     for off in self.offsets]
+            candidates = np.fromiter(
+                itertools.chain.from_iterable(s for s in found if s),
+                dtype=np.int64)
+            if not len(candidates):
+                continue
+            Xc = self.X[candidates]
+            rows = max(1, BLOCK // len(candidates))
+            for start in range(0, len(members), rows):
+                i = members[start:start + rows]
+                Xq = self.X[slots[i]]
+                dist = np.zeros((len(i), len(candidates)))
+                for k in range(self.dims):
+                    dist += (Xq[:, k, None] - Xc[None, :, k]) ** 2
+                yield i, candidates, (dist <= eps2).astype(np.float32)
+
+    def add_grid(self, slots):
+        for slot, cell in zip(slots.tolist(), map(tuple, self.cell[slots])):
+            self.grid.setdefault(cell, set()).add(slot)
+
+    def remove_grid(self, slots):
+        for slot, cell in zip(slots.tolist(), map(tuple, self.cell[slots])):
+            members = self.grid[cell]
+            members.discard(slot)
+            if not members:
+                del self.grid[cell]
+
+    def expire(self, slots):
+        if not len(slots):
+            return
+        self.live[slots] = False
+        self.remove_grid(slots)
+        for i, nbr, M in self.blocks(slots):
+            self.count[nbr] -= counts(M.sum(axis=0))
+            self.core_nbrs[nbr] -= counts(self.core[slots[i]] @ M)
+        self.count[slots] = 0
+        self.core[slots] = False
+        self.core_nbrs[slots] = 0
+        self.free.extend(slots.tolist())
+
+    def insert(self, times, values):
+        if len(self.free) < len(times):
+            self.grow(len(times) - len(self.free))
+        slots = np.array([self.free.pop() for _ in range(len(times))],
+                         dtype=np.int64)
+        self.t[slots] = times
+        self.raw[slots] = values
+        self.X[slots] = (values - self.mean) / self.scale
+        self.cell[slots] = np.floor(self.X[slots] / self.eps)
+        self.live[slots] = True
+        self.count[slots] = 0
+        self.core[slots] = False
+        self.core_nbrs[slots] = 0
+        self.add_grid(slots)
+        is_new = np.zeros(len(self.t), dtype=bool)
+        is_new[slots] = True
+
+        old_core = self.core.copy()
+        for i, nbr, M in self.blocks(slots):
+            self.count[slots[i]] += counts(M.sum(axis=1))
+            old = ~is_new[nbr]
+            self.count[nbr[old]] += counts(M[:, old].sum(axis=0))
+
+        # Core egoera aldatu duten puntu zaharrek auzokide zaharrei eragiten
+        # diete; berrienak behean kalkulatzen dira osorik.
+        self.core = self.live & (self.count >= self.min_samples)
+        flipped = np.flatnonzero((self.core != old_core) & self.live
+                                 & ~is_new)
+        sign = np.where(self.core[flipped], 1, -1)
+        for i, nbr, M in self.blocks(flipped):
+            old = ~is_new[nbr]
+            self.core_nbrs[nbr[old]] += counts(sign[i] @ M[:, old])
+        # Bere buruarekin ere kontatu da (distantzia 0).
+        self.core_nbrs[flipped] -= sign
+
+        for i, nbr, M in self.blocks(slots):
+            core = self.core[slots[i]]
+            self.core_nbrs[slots[i]] += counts(M @ self.core[nbr]) - core
+            old = ~is_new[nbr]
+            self.core_nbrs[nbr[old]] += counts(core @ M[:, old])
+        return slots
+
+    def rebuild(self, times, values):
+        self.reset(values.shape[1], max(1024, 2 * len(times)))
+        self.mean = values.mean(axis=0)
+        self.scale = self.clamp(values.std(axis=0))
+        self.rebuilds += 1
+        return self.insert(times, values)
+
+    def update(self, times, values):
+        """Leihoa (times int64 ns goranzkoak, values (n, d)) eguneratu eta
+        zarata diren errenkaden maskara itzuli."""
+        values = np.asarray(values, dtype=np.float64)
+        times = np.asarray(times, dtype=np.int64)
+        if not len(times):
+            return np.zeros(0, dtype=bool)
+        if np.any(np.diff(times) <= 0) or self.needs_rescale(values):
+            slots = self.rebuild(times, values)
+        else:
+            # Leihoko errenkadak slot zaharrekin lotu timestamp-aren bidez;
+            # balioak aldatu badira (merge_asof-en azken errenkadak) puntu
+            # berritzat hartzen dira.
+            known = self.t[self.order]
+            pos = np.minimum(np.searchsorted(known, times), len(known) - 1)
+            match = np.zeros(len(times), dtype=bool)
+            if len(known):
+                match = ((known[pos] == times)
+                         & np.all(self.raw[self.order[pos]] == values,
+                                  axis=1))
+            kept = self.order[pos[match]]
+            stale = np.setdiff1d(self.order, kept, assume_unique=True)
+            self.expire(stale)
+            slots = np.empty(len(times), dtype=np.int64)
+            slots[match] = kept
+            slots[~match] = self.insert(times[~match], values[~match])
+        self.order = slots
+        return ~self.core[slots] & (self.core_nbrs[slots] == 0)
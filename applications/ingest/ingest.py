@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Detektagailuen datu-bilketa partekatua.
+
+Eremu guztien azken leihoa (common.influx.SharedWindow) memorian gordetzen
+du eta HTTP bidez zerbitzatzen: GET /window?fields=A,B&seconds=50. faults
+eta transitions zerbitzuek INGEST_URL bidez erabiltzen dute, eta horrela
+bi zerbitzuek behar dituzten eremuak behin bakarrik kontsultatzen dira
+InfluxDB-n ziklo bakoitzeko.
+"""
+
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+from common import influx  # noqa: E402
+
+fields = ["ForwardPower", "ReflectionCoefficientMagnitude",
+          "IncidentPowerReference", "GasFlow", "PressureLEBT",
+          "CameraLuminosity"]
+# Detektagailuen leiho handiena (faults: 800 s) eta cache-aren iraupena:
+# eskaera batek datuak `max_age` segundo baino zaharragoak aurkitzen baditu,
+# InfluxDB berriro kontsultatzen da.
+window = int(os.getenv("INGEST_WINDOW", 800))
+max_age = float(os.getenv("INGEST_MAX_AGE", 2))
+port = int(os.getenv("INGEST_PORT", 8000))
+
+
+def make_handler(shared):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/window":
+                self.send_error(404)
+                return
+            params = parse_qs(url.query)
+            requested = (params["fields"][0].split(",")
+                         if "fields" in params else None)
+            try:
+                seconds = (float(params["seconds"][0])
+                           if "seconds" in params else None)
+            except ValueError:
+                self.send_error(400, "seconds zenbaki bat izan behar da")
+                return
+            try:
+                body = json.dumps(shared.snapshot(requested,
+                                                  seconds)).encode()
+            except Exception as e:
+                print(f'[ERROREA]: Leihoa ezin izan da prestatu: {e}')
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    bucket = os.getenv("BUCKET")
+    with influx.connect() as client:
+        shared = influx.SharedWindow(client, bucket, fields, window, max_age)
+        server = ThreadingHTTPServer(("", port), make_handler(shared))
+        print(f"[INFO] Ingest zerbitzua {port} atakan entzuten.")
+        server.serve_forever()
@@ -6,112 +6,69 @@ Created on Tue May 13 15:01:00 2025
 """
 
 import numpy as np
-from influxdb_client import InfluxDBClient
 import pandas as pd
 import time
 import os
+import sys
 from scipy.signal import find_peaks
-from scipy.stats import linregress
-from influxdb_client import Point
-# Query-ak ematen duen abisua ez agertzeko (pivot komando falta)
-import warnings
-from influxdb_client.client.warnings import MissingPivotFunction
-warnings.simplefilter("ignore", MissingPivotFunction)
-
-
-def get_data(bucket, client):
-    # Datuak lortzeko objetua hasiarazi.
-    query_api = client.query_api()
-    fields = ["ForwardPower", "ReflectionCoefficientMagnitude",
-              "IncidentPowerReference"]
-    measurement = "mqtt_consumer"
-    dataframes = {}
-    for field in fields:
-        query = f'''
-        from(bucket: "{bucket}")
-            |> range(start: -50s)
-            |> filter(fn: (r) => r["_measurement"] == "{measurement}")
-            |> filter(fn: (r) => r["_field"] == "{field}")
-            |> sort(columns: ["_time"])
-        '''
-
-        try:
-            # Lehen definitutako query-arentzat datuak lortu dataframe moduan.
-            result = query_api.query_data_frame(query)
-            if isinstance(result, list):
-                df = pd.concat(result, ignore_index=True)
-            else:
-                df = result
-
-            if (not df.empty and "_time" in df.columns
-                    and "_value" in df.columns):
-                df = df[["_time", "_value"]].rename(columns={"_value": field})
-
-                df["_time"] = pd.to_datetime(df["_time"])
-                df = df.dropna(subset=["_time"])
-
-                df[field] = pd.to_numeric(df[field], errors='coerce')
-                df = df.dropna(subset=[field])
-                df = df.sort_values("_time").reset_index(drop=True)
-
-                dataframes[field] = df
-            else:
-                print(f"[INFO] Ez dira datuak aurkitu {field} eremurako.")
-                dataframes[field] = pd.DataFrame(columns=["_time", field])
-        except Exception as e:
-            print(f'[ERROREA]: Akatsa InfluxDB kontsultatzean: {e}')
-            dataframes[field] = pd.DataFrame(columns=["_time", field])
-
-    merged_df = None
-    for field, df in dataframes.items():
-        if df.empty:
-            continue
-        if merged_df is None:
-            merged_df = df
-        else:
-            merged_df = pd.merge_asof(
-                merged_df.sort_values("_time"),
-                df.sort_values("_time"),
-                on="_time",
-                direction="nearest"
-            )
-
-    return (merged_df if merged_df is not None
-            and not merged_df.empty else pd.DataFrame())
-
-
-def calculate_adaptation(df):
-    if ("ForwardPower" in df.columns
-            and "ReflectionCoefficientMagnitude" in df.columns
-            and "IncidentPowerReference" in df.columns):
-        # Kalkulatu islatutako potentzia koefizientea erabiliz
-        df["ReflectedPower"] = (df["ReflectionCoefficientMagnitude"]
-                                * df["IncidentPowerReference"])
-        # Adaptazioa kalkulatu (ForwardPower - ReflectedPower)
-        df["Adaptation"] = df["ForwardPower"] - df["ReflectedPower"]
-    else:
-        df["Adaptation"] = np.nan
-    return df
 
-
-def calculate_noisefwd(df):
-    if ("ForwardPower" in df.columns
-            and "ReflectionCoefficientMagnitude" in df.columns
-            and "IncidentPowerReference" in df.columns):
-        # Kalkulatu zarata neurtutako eta erreferentziazko potentziak erabiliz
-        df["NoiseForward"] = (df["ForwardPower"] -
-                              df["IncidentPowerReference"])
-    else:
-        df["NoiseForward"] = np.nan
-    return df
-
-
-def ewma_filter(df, column, alpha=0.01):
-    if column in df.columns:
-        return df[column].ewm(alpha=alpha).mean()
-    else:
-        print(f'[ERROR]: {column} magnitudea ez da datuetan aurkitu.')
-        return df[column]
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+from common import influx, kernels, loop, metrics, writer  # noqa: E402
+from common import trigger as triggers  # noqa: E402
+
+fields = ["ForwardPower", "ReflectionCoefficientMagnitude",
+          "IncidentPowerReference"]
+window = 50
+cycle = float(os.getenv("CYCLE_SECONDS", 5))
+# Laginen artean tarte hau (s) baino handiagoa badago EWMA iragazkiak
+# hasieratik hasten dira.
+ewma_max_gap = float(os.getenv("EWMA_MAX_GAP", 60))
+
+
+class StreamingSignals:
+    """RF seinale eratorriak eta EWMA iragaziak zikloz ziklo.
+
+    Leihoko lagin berriak (azken ikusitakoa baino berriagoak) bakarrik
+    pasatzen dira kernels.transition_signals-etik, iragazkien egoeratik
+    jarraituta; leihoko lerro zaharrek lehen kalkulatutako balioak
+    berrerabiltzen dituzte. Iragaziak jarraipen osoaren gaineko
+    ewm(alpha).mean() dira, ez leihoarenak; max_gap segundotik gorako
+    hutsune batek egoera berrabiarazten du.
+    """
+
+    def __init__(self, alpha_adaptation=0.001, alpha_noise=0.02,
+                 max_gap=ewma_max_gap):
+        self.alphas = (alpha_adaptation, alpha_noise)
+        self.max_gap = int(pd.Timedelta(seconds=max_gap).value)
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.times = np.empty(0, dtype=np.int64)
+        self.values = np.empty((len(kernels.SIGNALS), 0))
+
+    def update(self, df):
+        # df: "_time" eta fields zutabeak; SIGNALS ordenako (5, n) array-a.
+        times = pd.DatetimeIndex(df["_time"]).as_unit("ns").asi8
+        new = (times > self.times[-1] if len(self.times)
+               else np.ones(len(times), dtype=bool))
+        if new.any():
+            t = times[new]
+            if len(self.times) and t[0] - self.times[-1] > self.max_gap:
+                self.reset()
+            rows = df.loc[new, fields].to_numpy(dtype=np.float64).T
+            values, self.state = kernels.transition_signals(
+                rows[0], rows[1], rows[2], *self.alphas, state=self.state)
+            keep = self.times >= times[0]
+            self.times = np.concatenate((self.times[keep], t))
+            self.values = np.concatenate((self.values[:, keep], values),
+                                         axis=1)
+        if not len(self.times):
+            return np.full((len(kernels.SIGNALS), len(times)), np.nan)
+        # Lerro bakoitzari bere denbora arteko azken balioak.
+        pos = np.searchsorted(self.times, times, "right") - 1
+        return self.values[:, np.maximum(pos, 0)]
 
 
 def detect_transition(df, threshold=0.05, prominence_noise=0.5):
@@ -126,8 +83,7 @@ def detect_transition(df, threshold=0.05, prominence_noise=0.5):
         df.loc[peak_noise_indices, "is_noise_peak"] = True
         # Datuentzako deribatua kalkulatu np funtzioarekin.
         x = df["_time"].astype(np.int64) / 1e9  # convertir a segundos
-        y = df["Adaptation_filtered"]
-        slope, _, _, _, _ = linregress(x, y)
+        slope = kernels.slope(x, df["Adaptation_filtered"])
         df["is_adaptation_jump"] = abs(slope) > threshold
         # Bueltatu deribatua ataria baino handiago duten lerroak.
         anomalies = df[df["is_noise_peak"] & df["is_adaptation_jump"]]
@@ -140,49 +96,48 @@ def detect_transition(df, threshold=0.05, prominence_noise=0.5):
         return False
 
 
-def save_transition(df, bucket, write_api):
-    for _, row in df.iterrows():
-        try:
-            point = (
-                Point("transitions")
-                .time(row["_time"])
-                .field("Adaptation_Filtered", row["Adaptation_filtered"])
-                .field("Noiseforward_Filtered", row["NoiseForward_filtered"])
-                )
-            write_api.write(bucket=bucket, record=point)
-        except Exception as e:
-            print(f'[ERROR] Ezin izan da puntua InfluxDB-n idatzi: {e}')
+def save_transition(df, transition_writer):
+    # Leiho osoa sorta batean; aurreko zikloetan idatzitako puntuak (leihoen
+    # gainjartzea) ez dira berriro bidaltzen.
+    points = df[["_time", "Adaptation_filtered", "NoiseForward_filtered"]]
+    points = points.rename(columns={
+        "Adaptation_filtered": "Adaptation_Filtered",
+        "NoiseForward_filtered": "Noiseforward_Filtered"})
+    transition_writer.write(points, ["Adaptation_Filtered",
+                                     "Noiseforward_Filtered"])
+
+
+def run(source, transition_writer, clock=time, until=None,
+        trigger=None):
+    # Iragazkien egoera zikloen artean mantentzen da.
+    rf_signals = StreamingSignals(0.001, 0.02)
+
+    def step(df):
+        if all(field in df.columns for field in fields):
+            # Seinale eratorri guztiak pasaera bakarrean.
+            with metrics.stage("signals"):
+                signals = rf_signals.update(df)
+            for name, values in zip(kernels.SIGNALS, signals):
+                df[name] = values
+        with metrics.stage("detect"):
+            detected = detect_transition(df)
+        if detected:
+            print("[INFO] Trantsizioa detektatuta! Leihoa gorde...")
+            metrics.inc("detector_transitions_total")
+            save_transition(df, transition_writer)
+        else:
+            print("[INFO] Ez dago trantsiziorik...")
+
+    loop.run(source, step, cycle, clock, until, trigger)
 
 
 if __name__ == "__main__":
-    influx_url = os.getenv("INFLUX_URL")
-    influx_token = os.getenv("INFLUX_TOKEN")
-    organization = os.getenv("ORGANIZATION")
     bucket = os.getenv("BUCKET")
-    with InfluxDBClient(url=influx_url, token=influx_token,
-                        org=organization) as client:
-        write_api = client.write_api()
-        while True:
-            start_time = time.time()
-            df = get_data(bucket, client)
-            if not df.empty:
-                df = calculate_adaptation(df)
-                df = calculate_noisefwd(df)
-                if "Adaptation" in df.columns and "NoiseForward" in df.columns:
-                    df["Adaptation_filtered"] = ewma_filter(
-                        df, "Adaptation", 0.001)
-                    df["NoiseForward_filtered"] = ewma_filter(
-                        df, "NoiseForward", 0.02)
-                if detect_transition(df):
-                    print("[INFO] Trantsizioa detektatuta! Leihoa gorde...")
-                    save_transition(df, bucket, write_api)
-                else:
-                    print("[INFO] Ez dago trantsiziorik...")
-            else:
-                print("[INFO] Ez dago daturik. Itxaroten...")
-                time.sleep(5)
-                prev_adaptation = None
-                prev_noise = None
-                continue
-            elapsed = time.time() - start_time
-            time.sleep(max(0, 5 - elapsed))
+    with influx.connect() as client, writer.write_api(client) as write_api:
+        transition_writer = writer.PointWriter(write_api, bucket,
+                                               "transitions", horizon=window)
+        source = influx.make_source(client, bucket, fields, window)
+        metrics.serve()
+        run(source, transition_writer,
+            trigger=triggers.make_trigger(client, bucket, fields[0], window,
+                                          cycle, source=source))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+CameraLuminosity-ren DBSCAN univariantearen neurketa.
+
+Eguneko CSV bakoitzean faults detektagailuaren leihoa (800 s, ~8000
+lagin) mugituz, StandardScaler + sklearn DBSCAN eta dbscan_1d
+exekutatzen dira, eta etiketak berdin-berdinak direla egiaztatzen da.
+
+Erabilera:
+    python benchmarks/dbscan1d_bench.py infrastructure/data
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.preprocessing import StandardScaler
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'infrastructure', 'simulator'))
+sys.path.insert(0, os.path.join(ROOT, 'applications', 'faults'))
+import daycache  # noqa: E402
+from dbscan1d import dbscan_1d  # noqa: E402
+
+COLUMN = 'CameraLuminosity'
+EPS = 0.6
+MIN_SAMPLES = 30
+
+
+def bench_folder(folder_path, window, step):
+    frame = daycache.read_frame(os.path.join(folder_path,
+                                             f'{COLUMN}_df.csv'))
+    values = frame[COLUMN].to_numpy(dtype=np.float64)
+    sklearn_time = engine_time = 0.0
+    windows = mismatches = 0
+    for start in range(0, max(1, len(values) - window + 1), step):
+        X = StandardScaler().fit_transform(values[start:start + window,
+                                                  None])
+        t0 = time.perf_counter()
+        expected = DBSCAN(eps=EPS, min_samples=MIN_SAMPLES).fit_predict(X)
+        sklearn_time += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        labels = dbscan_1d(X[:, 0], EPS, MIN_SAMPLES)
+        engine_time += time.perf_counter() - t0
+        windows += 1
+        mismatches += int(not np.array_equal(expected, labels))
+    return windows, mismatches, sklearn_time, engine_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_dir")
+    parser.add_argument("--window", type=int, default=8000,
+                        help="leihoaren lagin kopurua (800 s, 10 Hz)")
+    parser.add_argument("--step", type=int, default=2000)
+    args = parser.parse_args()
+
+    total_sklearn = total_engine = 0.0
+    for folder in sorted(os.listdir(args.data_dir)):
+        folder_path = os.path.join(args.data_dir, folder)
+        if not os.path.isfile(os.path.join(folder_path,
+                                           f'{COLUMN}_df.csv')):
+            continue
+        windows, mismatches, sklearn_time, engine_time = bench_folder(
+            folder_path, args.window, args.step)
+        total_sklearn += sklearn_time
+        total_engine += engine_time
+        print(f"{folder:>14}: {windows:4d} leiho, {mismatches} desberdin, "
+              f"sklearn {sklearn_time:7.3f}s, dbscan_1d {engine_time:7.3f}s")
+    print(f"Azkartzea: {total_sklearn / total_engine:.0f}x")
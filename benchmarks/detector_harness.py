@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+faults eta transitions detektagailuak grabatutako egunen gainean, erloju
+birtual batekin, denbora errealean itxaron gabe.
+
+Produkzioko faults.run eta transitions.run begiztak exekutatzen dira
+aldaketarik gabe, hiru ordezkorekin:
+
+  - VirtualClock: time() grabatutako denbora da eta sleep()-ek erlojua
+    aurreratu besterik ez du egiten (zikloen kadentzia bera, CYCLE_SECONDS);
+  - ReplaySource: erlojuaren unean InfluxDB-k itzuliko lukeen leihoa
+    (azken `window` segunduak, une horretaraino), influx.merge_fields bidez;
+  - CollectingWriteApi: PointWriter-ek bidaliko lituzkeen puntuak jasotzen
+    ditu, InfluxDB-n idatzi beharrean.
+
+Karpeta bakoitza egoera garbi batekin hasten da (DBSCAN motorrak, prozesu
+multzoak, iragazkiak). Puntuak CSV-etan gordetzen dira eta karpeta
+bakoitzaren zikloak, puntuak eta denbora errealarekiko abiadura
+inprimatzen dira.
+
+Erabilera:
+    python benchmarks/detector_harness.py infrastructure/data \\
+        --output-dir harness --workers 1
+"""
+
+import argparse
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'infrastructure', 'simulator'))
+sys.path.insert(0, os.path.join(ROOT, 'applications', 'transitions'))
+sys.path.insert(0, os.path.join(ROOT, 'applications', 'faults'))
+sys.path.insert(0, os.path.join(ROOT, 'applications'))
+import daycache  # noqa: E402
+import faults  # noqa: E402
+import transitions  # noqa: E402
+from common import alignment, influx, writer  # noqa: E402
+
+
+class VirtualClock:
+    """time.time() / time.sleep() ordezkoa: sleep-ek erlojua aurreratzen du."""
+
+    def __init__(self, start):
+        self.now = float(start)
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+class ReplaySource:
+    """Eremu bakoitzaren azken `window` segunduak erlojuaren uneraino."""
+
+    def __init__(self, frames, window, clock):
+        self.frames = frames
+        self.times = {field: alignment.to_ns(df["_time"])
+                      for field, df in frames.items()}
+        self.window = int(pd.Timedelta(seconds=window).value)
+        self.clock = clock
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        now = int(self.clock.time() * 1e9)
+        window = {}
+        for field, df in self.frames.items():
+            times = self.times[field]
+            lo = np.searchsorted(times, now - self.window, "left")
+            hi = np.searchsorted(times, now, "right")
+            window[field] = df.iloc[lo:hi].reset_index(drop=True)
+        return influx.merge_fields(window)
+
+
+class CollectingWriteApi:
+    """WriteApi.write()-ren ordezkoa: DataFrame puntuak memorian."""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, bucket, record, data_frame_measurement_name,
+              data_frame_tag_columns):
+        self.records.append(record.reset_index().assign(
+            _measurement=data_frame_measurement_name))
+
+    def points(self):
+        if not self.records:
+            return pd.DataFrame()
+        return pd.concat(self.records, ignore_index=True)
+
+
+def load_frames(folder_path, fields):
+    # Sentsore bakoitza (_time, eremua) frame batean, denboraz ordenatuta.
+    frames = {}
+    for field in fields:
+        df = daycache.read_frame(os.path.join(folder_path, f'{field}_df.csv'))
+        frames[field] = (df[["time", field]]
+                         .rename(columns={"time": "_time"})
+                         .sort_values("_time").reset_index(drop=True))
+    return frames
+
+
+def time_span(frames):
+    # (lehen lagina, azken lagina) epoch segundotan.
+    first = min(df["_time"].iloc[0] for df in frames.values())
+    last = max(df["_time"].iloc[-1] for df in frames.values())
+    return first.value / 1e9, last.value / 1e9
+
+
+def run_faults(frames, workers):
+    faults.engines = faults.make_engines(faults.eps_dict)
+    pools = faults.make_pools(faults.groups, workers)
+    start, until = time_span(frames)
+    clock = VirtualClock(start)
+    source = ReplaySource(frames, faults.window, clock)
+    write_api = CollectingWriteApi()
+    anomaly_writer = writer.PointWriter(write_api, "harness", "anomalies",
+                                        tag="source", horizon=faults.window)
+    try:
+        faults.run(source, anomaly_writer, pools, clock, until)
+    finally:
+        for pool in pools:
+            pool.shutdown()
+    return source.reads, write_api.points(), until - start
+
+
+def run_transitions(frames, workers):
+    start, until = time_span(frames)
+    clock = VirtualClock(start)
+    source = ReplaySource(frames, transitions.window, clock)
+    write_api = CollectingWriteApi()
+    transition_writer = writer.PointWriter(write_api, "harness",
+                                           "transitions",
+                                           horizon=transitions.window)
+    transitions.run(source, transition_writer, clock, until)
+    return source.reads, write_api.points(), until - start
+
+
+SERVICES = {
+    "faults": (faults.fields, run_faults),
+    "transitions": (transitions.fields, run_transitions),
+}
+
+
+def run_folder(folder_path, service, workers, verbose=False):
+    fields, runner = SERVICES[service]
+    frames = load_frames(folder_path, fields)
+    t0 = time.perf_counter()
+    if verbose:
+        reads, points, span = runner(frames, workers)
+    else:
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            reads, points, span = runner(frames, workers)
+    return reads, points, span, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_dir")
+    parser.add_argument("--services", default="faults,transitions")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--workers", type=int, default=faults.workers,
+                        help="faults taldeen prozesu kopurua")
+    parser.add_argument("--verbose", action="store_true",
+                        help="detektagailuen [INFO] mezuak erakutsi")
+    args = parser.parse_args()
+
+    folders = sorted(d for d in os.listdir(args.data_dir)
+                     if os.path.isfile(os.path.join(args.data_dir, d,
+                                                    'ForwardPower_df.csv')))
+    os.makedirs(args.output_dir, exist_ok=True)
+    for service in args.services.split(","):
+        results = []
+        for folder in folders:
+            reads, points, span, wall = run_folder(
+                os.path.join(args.data_dir, folder), service, args.workers,
+                args.verbose)
+            print(f"{service:>11} {folder:>14}: {reads:5d} ziklo, "
+                  f"{len(points):6d} puntu, {wall:7.1f}s "
+                  f"({span / wall:6.0f}x denbora erreala)")
+            if not points.empty:
+                results.append(points.assign(folder=folder))
+        output = os.path.join(args.output_dir, f"{service}.csv")
+        (pd.concat(results, ignore_index=True) if results
+         else pd.DataFrame()).to_csv(output, index=False)
+        print(f"[INFO] '{output}'-en gordeta.")
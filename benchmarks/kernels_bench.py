@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+RF seinale eratorrien neurketa: pandas bidea eta common.kernels.
+
+Eguneko hiru RF sentsoreak lerrokatu eta transitions detektagailuaren
+leihoak (50 s, ~500 lagin) mugituz, leiho bakoitzean bi bideak
+exekutatzen dira:
+
+  - pandas: calculate_adaptation/calculate_noisefwd zutabe esleipenak,
+    ewm(alpha).mean() bi aldiz eta linregress;
+  - kernels: transition_signals (pasaera bakarra) eta kernels.slope.
+
+Emaitzak berdinak direla egiaztatzen da (tolerantzia 1e-9, erlatiboa).
+
+Erabilera:
+    python benchmarks/kernels_bench.py infrastructure/data
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import linregress
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'infrastructure', 'simulator'))
+sys.path.insert(0, os.path.join(ROOT, 'applications'))
+import daycache  # noqa: E402
+from common import kernels  # noqa: E402
+
+FIELDS = ['ForwardPower', 'ReflectionCoefficientMagnitude',
+          'IncidentPowerReference']
+ALPHA_ADAPTATION = 0.001
+ALPHA_NOISE = 0.02
+
+
+def load_folder(folder_path):
+    frames = [daycache.read_frame(os.path.join(folder_path,
+                                               f'{field}_df.csv'))
+              [['time', field]].sort_values('time') for field in FIELDS]
+    df = frames[0]
+    for frame in frames[1:]:
+        df = pd.merge_asof(df, frame, on='time', direction='nearest')
+    return df
+
+
+def pandas_path(df):
+    df = df.copy()
+    df["ReflectedPower"] = (df["ReflectionCoefficientMagnitude"]
+                            * df["IncidentPowerReference"])
+    df["Adaptation"] = df["ForwardPower"] - df["ReflectedPower"]
+    df["NoiseForward"] = df["ForwardPower"] - df["IncidentPowerReference"]
+    df["Adaptation_filtered"] = df["Adaptation"].ewm(
+        alpha=ALPHA_ADAPTATION).mean()
+    df["NoiseForward_filtered"] = df["NoiseForward"].ewm(
+        alpha=ALPHA_NOISE).mean()
+    x = df["time"].astype(np.int64) / 1e9
+    slope, _, _, _, _ = linregress(x, df["Adaptation_filtered"])
+    return df[list(kernels.SIGNALS)].to_numpy().T, slope
+
+
+def kernels_path(df):
+    signals, _ = kernels.transition_signals(
+        df["ForwardPower"], df["ReflectionCoefficientMagnitude"],
+        df["IncidentPowerReference"], ALPHA_ADAPTATION, ALPHA_NOISE)
+    x = pd.DatetimeIndex(df["time"]).as_unit("ns").asi8 / 1e9
+    return signals, kernels.slope(x, signals[3])
+
+
+def bench_folder(folder_path, window, step):
+    df = load_folder(folder_path)
+    pandas_time = kernels_time = 0.0
+    windows = mismatches = 0
+    for start in range(0, max(1, len(df) - window + 1), step):
+        frame = df.iloc[start:start + window]
+        t0 = time.perf_counter()
+        expected, expected_slope = pandas_path(frame)
+        pandas_time += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        signals, slope = kernels_path(frame)
+        kernels_time += time.perf_counter() - t0
+        windows += 1
+        mismatches += int(not (
+            np.allclose(expected, signals, rtol=1e-9, equal_nan=True)
+            and np.isclose(expected_slope, slope, rtol=1e-9,
+                           equal_nan=True)))
+    return windows, mismatches, pandas_time, kernels_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_dir")
+    parser.add_argument("--window", type=int, default=500,
+                        help="leihoaren lagin kopurua (50 s, 10 Hz)")
+    parser.add_argument("--step", type=int, default=50)
+    args = parser.parse_args()
+
+    print("numba:", "bai" if kernels.fused_loop is not None else "ez")
+    total_pandas = total_kernels = 0.0
+    for folder in sorted(os.listdir(args.data_dir)):
+        folder_path = os.path.join(args.data_dir, folder)
+        if not os.path.isfile(os.path.join(folder_path,
+                                           f'{FIELDS[0]}_df.csv')):
+            continue
+        windows, mismatches, pandas_time, kernels_time = bench_folder(
+            folder_path, args.window, args.step)
+        total_pandas += pandas_time
+        total_kernels += kernels_time
+        print(f"{folder:>14}: {windows:4d} leiho, {mismatches} desberdin, "
+              f"pandas {pandas_time:7.3f}s, kernels {kernels_time:7.3f}s")
+    print(f"Azkartzea: {total_pandas / total_kernels:.1f}x")
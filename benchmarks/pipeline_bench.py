@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Kate osoaren neurketa grabatutako egunekin, kanpoko zerbitzurik gabe.
+
+infrastructure/data/<eguna> karpeta bakoitza prozesu bakarrean
+errepikatzen da, broker-aren eta InfluxDB-ren ordezko lokalekin:
+
+  - simulatzailea: simulator.replay_folder bera, abiadura maximoan,
+    AsyncPublisher eta paho bezeroaren ordezko baten bidez broker-aren
+    ilarara (gertaera/s);
+  - ingest: Telegraf-en ordezko hari batek mezuak parseatu eta biltegian
+    gordetzen ditu (mezu/s eta publikatzetik gordetzera arteko atzerapena);
+  - get_data: influx.get_data biltegiaren gainean ("field" modua). Ordezkoak
+    DataFrame-ak zuzenean ematen ditu, beraz neurtzen dena query_field-en
+    prozesaketa eta lerrokatzea da, ez sareko CSV-aren deskodetzea;
+  - dbscan: faults.dbscan_multi (rf, huts) eta dbscan_uni (CameraLuminosity)
+    800 s-ko leihoetan, 15 s-ro mugituta (DBSCAN_MODE-ren arabera);
+  - transition: transitions.StreamingSignals eta detect_transition 50 s-ko
+    leihoetan, 5 s-ro mugituta.
+
+Emaitzak JSON fitxategi batean gordetzen dira (commit-a eta data barne);
+--baseline emanez gero, aurreko fitxategiarekiko aldaketak inprimatzen
+dira.
+
+Erabilera:
+    python benchmarks/pipeline_bench.py infrastructure/data \\
+        --output pipeline.json --baseline aurrekoa.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'infrastructure', 'simulator'))
+sys.path.insert(0, os.path.join(ROOT, 'applications', 'transitions'))
+sys.path.insert(0, os.path.join(ROOT, 'applications', 'faults'))
+sys.path.insert(0, os.path.join(ROOT, 'applications'))
+import paho.mqtt.client as mqtt  # noqa: E402
+import replay  # noqa: E402
+import simulator  # noqa: E402
+from publisher import AsyncPublisher  # noqa: E402
+from simulator import csv_files_list  # noqa: E402
+import faults  # noqa: E402
+import transitions  # noqa: E402
+from common import influx  # noqa: E402
+
+TOPIC_PREFIX = 'sensor'
+
+
+def summary(seconds):
+    # Neurketa zerrenda baten laburpena (s).
+    if not len(seconds):
+        return {"count": 0}
+    seconds = np.asarray(seconds, dtype=float)
+    return {"count": int(len(seconds)),
+            "total": float(seconds.sum()),
+            "mean": float(seconds.mean()),
+            "p50": float(np.percentile(seconds, 50)),
+            "p95": float(np.percentile(seconds, 95)),
+            "p99": float(np.percentile(seconds, 99)),
+            "max": float(seconds.max())}
+
+
+class LocalBroker:
+    """paho bezeroaren eta broker-aren ordezkoa: mezuak ilara batean,
+    publikatze unearekin, eta berehala baieztatuta (PUBACK)."""
+
+    def __init__(self):
+        self.messages = queue.Queue()
+        self.on_publish = None
+        self.mid = 0
+
+    def publish(self, topic, payload, qos=0):
+        self.messages.put((time.perf_counter(), topic, payload))
+        self.mid += 1
+        if self.on_publish:
+            self.on_publish(self, None, self.mid)
+        return SimpleNamespace(rc=mqtt.MQTT_ERR_SUCCESS, mid=self.mid)
+
+    def close(self):
+        self.messages.put(None)
+
+
+class LocalTelegraf(threading.Thread):
+    """Telegraf-en ordezkoa: broker-aren mezuak eremu bakoitzeko biltegira."""
+
+    def __init__(self, broker):
+        super().__init__(daemon=True)
+        self.broker = broker
+        self.samples = {}
+        self.lags = []
+        self.received = 0
+        self.elapsed = 0.0
+
+    def run(self):
+        t0 = None
+        while True:
+            item = self.broker.messages.get()
+            if item is None:
+                break
+            sent, topic, payload = item
+            t0 = t0 or time.perf_counter()
+            sample = json.loads(payload)
+            stamp = sample.pop("time")
+            for field, value in sample.items():
+                times, values = self.samples.setdefault(field, ([], []))
+                times.append(stamp)
+                values.append(value)
+            self.received += 1
+            self.lags.append(time.perf_counter() - sent)
+        self.elapsed = time.perf_counter() - t0 if t0 else 0.0
+
+    def store(self):
+        return {field: pd.DataFrame({
+                    "_time": pd.to_datetime(times, utc=True,
+                                            format="ISO8601"),
+                    "_value": np.asarray(values, dtype=float)})
+                .sort_values("_time").reset_index(drop=True)
+                for field, (times, values) in self.samples.items()}
+
+
+class LocalQueryApi:
+    """InfluxDB-ren query_api ordezkoa, query_field-en Flux-erako bakarrik.
+
+    range() erlatiboa `now`-ekiko ebazten da (grabatutako denbora).
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.now = None
+
+    def query_data_frame(self, query):
+        start = re.search(r'range\(start: (.*?)\)\n', query).group(1)
+        if start.startswith('-'):
+            t0 = self.now - pd.Timedelta(seconds=float(start[1:-1]))
+        else:
+            t0 = pd.Timestamp(re.search(r'"(.*)"', start).group(1))
+        frames = []
+        for field in re.findall(r'r\["_field"\] == "(\w+)"', query):
+            df = self.store.get(field)
+            if df is None:
+                continue
+            times = df["_time"]
+            lo, hi = times.searchsorted(t0, "left"), times.searchsorted(
+                self.now, "right")
+            part = df.iloc[lo:hi]
+            frames.append(pd.DataFrame({
+                "result": "_result", "table": 0, "_time": part["_time"],
+                "_value": part["_value"], "_field": field,
+                "_measurement": influx.MEASUREMENT}))
+        return (pd.concat(frames, ignore_index=True) if frames
+                else pd.DataFrame())
+
+
+class RecordedClock:
+    """SyntheticClock-en ordezkoa: grabatutako timestamp-ak aldatu gabe."""
+
+    def begin(self, first_ns):
+        pass
+
+    def __call__(self, t_ns):
+        return int(t_ns)
+
+
+class LocalClient:
+    def __init__(self, store):
+        self.api = LocalQueryApi(store)
+
+    def query_api(self):
+        return self.api
+
+
+async def replay_events(broker, blocks):
+    publisher = AsyncPublisher(broker, simulator.MQTT_QOS,
+                               simulator.MAX_INFLIGHT, verbose=False)
+    scheduler = replay.DeadlineScheduler(None)
+    await simulator.replay_folder(publisher, blocks, scheduler,
+                                  RecordedClock(), None, TOPIC_PREFIX)
+    await publisher.drain()
+
+
+def bench_replay(folder_path):
+    # Simulatzailea eta ingest-a: replay_folder -> AsyncPublisher ->
+    # broker -> Telegraf.
+    blocks = quiet(simulator.folder_blocks, folder_path)
+    # Atzerapen txostenak ez dira neurketaren parte.
+    simulator.LAG_REPORT_INTERVAL = 0
+    broker = LocalBroker()
+    telegraf = LocalTelegraf(broker)
+    telegraf.start()
+    t0 = time.perf_counter()
+    asyncio.run(replay_events(broker, blocks))
+    elapsed = time.perf_counter() - t0
+    # Gertaera bakoitza mezu bat da ("sensor" moduan); blokeak zatika
+    # irakur daitezke (STREAM_CHUNK_ROWS), beraz publikatutakoak zenbatu.
+    events = broker.mid
+    broker.close()
+    telegraf.join()
+    simulator_stats = {"events": events, "seconds": elapsed,
+                       "events_per_second": events / elapsed}
+    ingest = {"messages": telegraf.received, "seconds": telegraf.elapsed,
+              "messages_per_second": (telegraf.received / telegraf.elapsed
+                                      if telegraf.elapsed else 0.0),
+              "lag": summary(telegraf.lags)}
+    return simulator_stats, ingest, telegraf.store()
+
+
+def window_ends(store, fields, window, cycle, max_cycles):
+    # Lehen leiho osoaren bukaeratik aurrera, `cycle` segundoro.
+    first = max(store[f]["_time"].iloc[0] for f in fields if f in store)
+    last = min(store[f]["_time"].iloc[-1] for f in fields if f in store)
+    ends = pd.date_range(first + pd.Timedelta(seconds=window), last,
+                         freq=pd.Timedelta(seconds=cycle))
+    return ends[:max_cycles]
+
+
+def bench_faults(client, store, max_cycles):
+    engines = faults.make_engines(faults.eps_dict)
+    timings = {"get_data": [], "dbscan_multi": [], "dbscan_uni": []}
+    anomalies = 0
+    for end in window_ends(store, faults.fields, faults.window,
+                           faults.cycle, max_cycles):
+        client.api.now = end
+        t0 = time.perf_counter()
+        df = influx.get_data('bench', client, faults.fields, faults.window,
+                             mode="field")
+        timings["get_data"].append(time.perf_counter() - t0)
+        if df.empty:
+            continue
+        for columns, name in faults.groups:
+            t0 = time.perf_counter()
+            if len(columns) > 1:
+                key = f"{name}_taldea"
+                result = faults.dbscan_multi(df, columns, name,
+                                             faults.eps_dict[key],
+                                             engines.get(key))
+                timings["dbscan_multi"].append(time.perf_counter() - t0)
+            else:
+                result = faults.dbscan_uni(df, columns[0],
+                                           faults.eps_dict[columns[0]])
+                timings["dbscan_uni"].append(time.perf_counter() - t0)
+            anomalies += len(result)
+    return timings, anomalies
+
+
+def bench_transitions(client, store, max_cycles):
+    signals = transitions.StreamingSignals()
+    timings = {"get_data": [], "signals": [], "detect_transition": []}
+    detected = 0
+    for end in window_ends(store, transitions.fields, transitions.window,
+                           transitions.cycle, max_cycles):
+        client.api.now = end
+        t0 = time.perf_counter()
+        df = influx.get_data('bench', client, transitions.fields,
+                             transitions.window, mode="field")
+        timings["get_data"].append(time.perf_counter() - t0)
+        if df.empty:
+            continue
+        t0 = time.perf_counter()
+        for name, values in zip(transitions.kernels.SIGNALS,
+                                signals.update(df)):
+            df[name] = values
+        timings["signals"].append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        detected += int(transitions.detect_transition(df))
+        timings["detect_transition"].append(time.perf_counter() - t0)
+    return timings, detected
+
+
+def quiet(func, *args):
+    # Detektagailuen [INFO] mezuak neurketatik kanpo utzi.
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        return func(*args)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def bench_folder(folder_path, max_cycles):
+    simulator_stats, ingest, store = bench_replay(folder_path)
+    client = LocalClient(store)
+    fault_timings, anomalies = quiet(bench_faults, client, store, max_cycles)
+    transition_timings, detected = quiet(bench_transitions, client, store,
+                                         max_cycles)
+    return {
+        "simulator": simulator_stats,
+        "ingest": ingest,
+        "faults": {stage: summary(t) for stage, t in fault_timings.items()},
+        "transitions": {stage: summary(t)
+                        for stage, t in transition_timings.items()},
+        "anomalies": anomalies,
+        "transitions_detected": detected,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def headline(results):
+    # Karpeta guztien neurri nagusiak, alderatzeko.
+    days = results["folders"].values()
+    rows = {
+        "simulator events/s": [d["simulator"]["events_per_second"]
+                               for d in days],
+        "ingest messages/s": [d["ingest"]["messages_per_second"]
+                              for d in days],
+        "ingest lag p99 (s)": [d["ingest"]["lag"]["p99"] for d in days],
+    }
+    for service in ("faults", "transitions"):
+        for stage in next(iter(results["folders"].values()))[service]:
+            rows[f"{service} {stage} mean (s)"] = [
+                d[service][stage]["mean"] for d in days
+                if d[service][stage]["count"]]
+    return {name: float(np.mean(v)) for name, v in rows.items() if v}
+
+
+def report(results, baseline=None):
+    current = headline(results)
+    previous = headline(baseline) if baseline else {}
+    for name, value in current.items():
+        line = f"{name:>40}: {value:12.6g}"
+        if name in previous and previous[name]:
+            line += f"  ({value / previous[name]:6.2f}x aurrekoarekiko)"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_dir")
+    parser.add_argument("--output", default="pipeline_bench.json")
+    parser.add_argument("--baseline", default=None,
+                        help="aurreko exekuzio baten JSON fitxategia")
+    parser.add_argument("--max-cycles", type=int, default=40,
+                        help="detektagailu bakoitzeko ziklo kopurua karpetako")
+    args = parser.parse_args()
+
+    results = {"commit": git_commit(),
+               "created": pd.Timestamp.now(tz="UTC").isoformat(),
+               "python": platform.python_version(),
+               "max_cycles": args.max_cycles,
+               "folders": {}}
+    for folder in sorted(os.listdir(args.data_dir)):
+        folder_path = os.path.join(args.data_dir, folder)
+        if not os.path.isfile(os.path.join(folder_path,
+                                           csv_files_list['ForwardPower'])):
+            continue
+        print(f"[INFO] '{folder}' karpeta neurtzen.")
+        results["folders"][folder] = bench_folder(folder_path,
+                                                  args.max_cycles)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[INFO] Emaitzak '{args.output}'-en gordeta.")
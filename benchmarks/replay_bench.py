@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Simulatzailearen errepikapen motorraren neurketa (gertaerak/s).
+
+Karpeta bateko CSV-ak irakurri eta bi motorrak exekutatzen dira, MQTT
+broker-ik eta itxaronik gabe: lehengo pandas begizta (DataFrame guztiak
+tick bakoitzean) eta replay.EventStream. Payload-a JSON-era bihurtzen da
+bietan, publikatzeko kostua izan ezik dena neurtzeko.
+
+Erabilera:
+    python benchmarks/replay_bench.py infrastructure/data/2024-03-13
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'infrastructure', 'simulator'))
+import replay  # noqa: E402
+from simulator import csv_files_list  # noqa: E402
+
+TIMESTAMP_COLUMN = 'time'
+
+
+def load_dataframes(folder_path):
+    dataframes = {}
+    for sensor_name, csv_file in csv_files_list.items():
+        df = pd.read_csv(os.path.join(folder_path, csv_file),
+                         parse_dates=[TIMESTAMP_COLUMN], index_col=0)
+        dataframes[sensor_name] = (df.sort_values(by=TIMESTAMP_COLUMN)
+                                   .reset_index(drop=True))
+    return dataframes
+
+
+def legacy_replay(dataframes, max_events):
+    # Lehengo simulator.py-ko begizta, publikatu eta itxaron gabe.
+    all_indices = {sensor: 0 for sensor in dataframes}
+    sent = 0
+    while sent < max_events:
+        earliest_timestamp = None
+        for sensor_name, df in dataframes.items():
+            current_index = all_indices[sensor_name]
+            if current_index < len(df):
+                ts = df.loc[current_index, TIMESTAMP_COLUMN]
+                if earliest_timestamp is None or ts < earliest_timestamp:
+                    earliest_timestamp = ts
+        if earliest_timestamp is None:
+            break
+        for sensor_name, df in dataframes.items():
+            current_index = all_indices[sensor_name]
+            if (current_index < len(df)
+                and df.loc[current_index,
+                           TIMESTAMP_COLUMN] == earliest_timestamp):
+                data_row = df.drop(columns=[TIMESTAMP_COLUMN]).iloc[
+                    current_index].to_dict()
+                data_row["time"] = pd.Timestamp.now("UTC").isoformat(
+                    timespec="nanoseconds") + "Z"
+                json.dumps(data_row)
+                all_indices[sensor_name] += 1
+                sent += 1
+    return sent
+
+
+def stream_replay(sensors, max_events):
+    stream = replay.EventStream(sensors)
+    sent = 0
+    for start, end in stream.tick_bounds():
+        for i in range(start, end):
+            sensor_name, data_row = stream.event(i)
+            data_row["time"] = replay.format_ns(time.time_ns()) + "Z"
+            json.dumps(data_row)
+            sent += 1
+        if sent >= max_events:
+            break
+    return sent
+
+
+def measure(name, func, *args):
+    t0 = time.perf_counter()
+    events = func(*args)
+    elapsed = time.perf_counter() - t0
+    print(f"{name:>8}: {events:8d} gertaera {elapsed:8.2f}s "
+          f"{events / elapsed:12.0f} gertaera/s")
+    return events / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder")
+    parser.add_argument("--legacy-events", type=int, default=2000,
+                        help="lehengo begiztarako gertaera kopurua "
+                             "(oso motela da karpeta osoarentzat)")
+    args = parser.parse_args()
+
+    dataframes = load_dataframes(args.folder)
+    sensors = {name: replay.read_sensor(os.path.join(args.folder, f))
+               for name, f in csv_files_list.items()}
+    before = measure("pandas", legacy_replay, dataframes, args.legacy_events)
+    after = measure("stream", stream_replay, sensors, float("inf"))
+    print(f"Azkartzea: {after / before:.0f}x")
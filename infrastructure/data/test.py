@@ -8,19 +8,28 @@ Created on Sat May 17 14:58:01 2025
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.signal import find_peaks
+from scipy.signal import find_peaks, lfilter
 from scipy.stats import linregress
 import sys
 import os
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'simulator'))
+import daycache  # noqa: E402
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..', 'applications'))
+from common import alignment, kernels  # noqa: E402
+
 
 def calculate_adaptation(df):
     if ("ForwardPower" in df.columns
             and "ReflectionCoefficientMagnitude" in df.columns
             and "IncidentPowerReference" in df.columns):
-        df["ReflectedPower"] = (df["ReflectionCoefficientMagnitude"]
-                                * df["IncidentPowerReference"])
-        df["Adaptation"] = df["ForwardPower"] - df["ReflectedPower"]
+        reflected, adaptation, _ = kernels.rf_signals(
+            df["ForwardPower"], df["ReflectionCoefficientMagnitude"],
+            df["IncidentPowerReference"])
+        df["ReflectedPower"] = reflected
+        df["Adaptation"] = adaptation
     else:
         df["Adaptation"] = np.nan
     return df
@@ -29,8 +38,9 @@ def calculate_adaptation(df):
 def calculate_noisefwd(df):
     if ("ForwardPower" in df.columns
             and "IncidentPowerReference" in df.columns):
-        df["NoiseForward"] = (df["ForwardPower"] -
-                              df["IncidentPowerReference"])
+        df["NoiseForward"] = np.subtract(
+            kernels.as_array(df["ForwardPower"]),
+            kernels.as_array(df["IncidentPowerReference"]))
     else:
         df["NoiseForward"] = np.nan
     return df
@@ -44,7 +54,94 @@ def ewma_filter(df, column, alpha=0.01):
         return df[column]
 
 
+def ewma_state(values, alpha):
+    # S[j] = (1 - alpha) * S[j - 1] + x[j]: EWMA errekurtsiboaren egoera.
+    return lfilter([1.0], [1.0, alpha - 1.0], kernels.as_array(values))
+
+
+def window_ewma(state, start, window_size, alpha):
+    # ewm(alpha).mean() [start, start + window_size) leihoan hasieratik
+    # kalkulatuta, egoera errekurtsibotik O(window_size)-n:
+    # (S[start + k] - r^(k + 1) S[start - 1]) / (1 + r + ... + r^k).
+    r = 1.0 - alpha
+    decay = r ** np.arange(1, window_size + 1)
+    prev = state[start - 1] if start else 0.0
+    return ((state[start:start + window_size] - decay * prev)
+            * alpha / (1.0 - decay))
+
+
 def detect_anomaly(df, threshold=0.06, prominence_noise=0.5, window_size=500):
+    """detect_anomaly_windows-en emaitza bera, leihoz leiho kopiatu gabe.
+
+    Leiho bakoitzaren EWMA (hasieratik kalkulatua) serie osoaren egoera
+    errekurtsibotik lortzen da. Horrela leiho guztien karratu txikienen
+    maldak korrelazio finko batzuetatik ateratzen dira pasaera bakarrean.
+    Zarata gailurrak (find_peaks) maldaren baldintza betetzen duten
+    leihoetan bakarrik bilatzen dira.
+    """
+    if "Adaptation" in df.columns and "NoiseForward" in df.columns:
+        df = df.sort_values("time").reset_index(drop=True)
+        if (df["Adaptation"].isna().any() or df["NoiseForward"].isna().any()
+                or df["time"].isna().any()):
+            # NaN-ekin pandas-en ewm-ak pisuak berriro kalkulatzen ditu.
+            return detect_anomaly_windows(df, threshold, prominence_noise,
+                                          window_size)
+        n = len(df)
+        starts = n - window_size
+        if starts <= 0:
+            return pd.DataFrame()
+        W = window_size
+        alpha_a, alpha_n = 0.001, 0.02
+        adaptation_state = ewma_state(df["Adaptation"].to_numpy(), alpha_a)
+        noise_state = ewma_state(df["NoiseForward"].to_numpy(), alpha_n)
+        time_seconds = df["time"].astype(np.int64).to_numpy() / 1e9
+        time_seconds = time_seconds - time_seconds[0]
+
+        # Leihoko EWMA: sum_k w[k] S[s + k] - S[s - 1] * sum_k c[k].
+        decay = (1.0 - alpha_a) ** np.arange(1, W + 1)
+        w = alpha_a / (1.0 - decay)
+        c = decay * w
+        prev = np.concatenate(([0.0], adaptation_state[:starts - 1]))
+        sy = (np.correlate(adaptation_state, w, "valid")[:starts]
+              - prev * c.sum())
+        sxy = (np.correlate(time_seconds * adaptation_state, w,
+                            "valid")[:starts]
+               - prev * np.correlate(time_seconds, c, "valid")[:starts])
+        cumsum = np.concatenate(([0.0], np.cumsum(time_seconds)))
+        sx = (cumsum[W:] - cumsum[:-W])[:starts]
+        cumsum = np.concatenate(([0.0], np.cumsum(time_seconds ** 2)))
+        sxx = (cumsum[W:] - cumsum[:-W])[:starts]
+        slope = (sxy - sx * sy / W) / (sxx - sx * sx / W)
+
+        is_adaptation_jump = np.zeros(n + 1, dtype=np.int64)
+        is_noise_peak = np.zeros(n, dtype=bool)
+        for start in np.flatnonzero(np.abs(slope) > threshold):
+            noise_filtered = window_ewma(noise_state, start, W, alpha_n)
+            peak_indices, _ = find_peaks(noise_filtered,
+                                         prominence=prominence_noise)
+            if len(peak_indices) == 0:
+                continue
+            # df.loc[start:end] bezala, end barne.
+            is_adaptation_jump[start] += 1
+            is_adaptation_jump[min(start + W + 1, n)] -= 1
+            is_noise_peak[start + peak_indices] = True
+        is_adaptation_jump = np.cumsum(is_adaptation_jump[:n]) > 0
+
+        anomalies = df[is_noise_peak & is_adaptation_jump]
+        if not anomalies.empty:
+            return anomalies[["time", "Adaptation",
+                              "NoiseForward"]]
+        else:
+            return pd.DataFrame()
+    else:
+        print('[ERROR] Beharrezko zutabeak ez dira aurkitu.')
+        return pd.DataFrame()
+
+
+def detect_anomaly_windows(df, threshold=0.06, prominence_noise=0.5,
+                           window_size=500):
+    # Jatorrizko errenkadaz errenkadako bertsioa (erreferentzia, O(n * W)):
+    # leiho bakoitzean EWMA, find_peaks eta linregress hasieratik.
     if "Adaptation" in df.columns and "NoiseForward" in df.columns:
         df = df.sort_values("time")
         df["is_adaptation_jump"] = False
@@ -119,11 +216,8 @@ if __name__ == "__main__":
             for sensor_name, csv_file in csv_files_list.items():
                 file = os.path.join(folder_path, csv_file)
                 try:
-                    df = pd.read_csv(file, parse_dates=[TIMESTAMP_COLUMN],
-                                     index_col=INDEX_COLUMN)
-                    df = df.sort_values(by=TIMESTAMP_COLUMN)
-                    df = df.reset_index(drop=True)
-                    dataframes[sensor_name] = df
+                    # Cache bitarra (.npy) baliozkoa bada hortik irakurri.
+                    dataframes[sensor_name] = daycache.read_frame(file)
                     print(f"[INFO] '{csv_file}' artxiboa irakurrita.")
                 except FileNotFoundError:
                     print(f"[ERROR]: Ez da '{csv_file}' fitxategia aurkitu.")
@@ -141,20 +235,12 @@ if __name__ == "__main__":
             if all(key in dataframes for key
                    in ['ForwardPower', 'ReflectionCoefficientMagnitude',
                        'IncidentPowerReference']):
-                # Sortu df berri bat beharrezkoak ditugun magnitudeak batuz
-                df_fp = dataframes['ForwardPower'][
-                    ['time', 'ForwardPower']].sort_values('time')
-                df_rcm = dataframes['ReflectionCoefficientMagnitude'][
-                    ['time',
-                     'ReflectionCoefficientMagnitude']].sort_values('time')
-                df_ipr = dataframes['IncidentPowerReference'][
-                    ['time', 'IncidentPowerReference']].sort_values('time')
-
-                # Hacer merges aproximados (por tiempo más cercano)
-                df_merged = pd.merge_asof(df_fp, df_rcm, on='time',
-                                          direction='nearest')
-                df_merged = pd.merge_asof(df_merged, df_ipr, on='time',
-                                          direction='nearest')
+                # Sortu df berri bat beharrezkoak ditugun magnitudeak
+                # sareta finko batean lerrokatuta (common.alignment).
+                df_merged = alignment.align_frames(
+                    {key: dataframes[key] for key in
+                     ['ForwardPower', 'ReflectionCoefficientMagnitude',
+                      'IncidentPowerReference']}, 'time')
                 # Kalkulatu adaptazioa eta aurreranzko zarata
                 df_merged = calculate_adaptation(df_merged.copy())
                 df_merged = calculate_noisefwd(df_merged.copy())
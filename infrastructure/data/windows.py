@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Grabatutako egunen DBSCAN leihokatua, lineaz kanpo.
+
+Leiho bakoitza (ventana_segundos-eko tarte ez-gainjarriak, lehen
+laginetik hasita) ordenatutako denbora zutabean searchsorted bidez
+mozten da, DataFrame osoa leiho bakoitzean maskara batekin berriro
+aztertu gabe. Leihoak prozesu multzo batean exekutatzen dira, karpeta
+guztietarako, eta anomaliak CSV batean idazten dira. Taldeetako
+sentsoreak common.alignment-en saretan lerrokatzen dira (ALIGN_PERIOD_MS,
+lehenetsita 100 ms, eta ALIGN_TOLERANCE_MS), ez errenkadaren posizioaren
+arabera.
+
+Erabilera:
+    python windows.py . --output anomaliak.csv --workers 4
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import DBSCAN
+from sklearn.preprocessing import StandardScaler
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'simulator'))
+import daycache  # noqa: E402
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..', 'applications'))
+from common import alignment  # noqa: E402
+
+# DBSCAN PARAMETERS
+eps_dict = {
+    "rf_taldea": 14,
+    "huts_taldea": 0.32,
+    "CameraLuminosity": 0.7
+}
+min_samples = 30
+ventana_segundos = 800
+
+TIMESTAMP_COLUMN = 'time'
+csv_files_list = {
+    'CameraLuminosity': 'CameraLuminosity_df.csv',
+    'ForwardPower': 'ForwardPower_df.csv',
+    'GasFlow': 'GasFlow_df.csv',
+    'IncidentPowerReference': 'IncidentPowerReference_df.csv',
+    'PressureLEBT': 'PressureLEBT_df.csv',
+    'ReflectionCoefficientMagnitude':
+        'ReflectionCoefficientMagnitude_df.csv',
+    'ReflectionCoefficientPhase':
+        'ReflectionCoefficientPhase_df.csv',
+    'RfPower': 'RfPower_df.csv'
+}
+rf_taldea_cols = ["ForwardPower", "IncidentPowerReference", "RfPower"]
+huts_taldea_cols = ["PressureLEBT", "GasFlow"]
+
+
+def dbscan_multi(df, columns, talde, eps):
+    if not all(col in df.columns for col in columns):
+        print(f'[ERROR] DBSCAN egiteko zutabeak falta dira: {columns}')
+        return pd.DataFrame()
+    Xf = df.dropna(subset=columns)
+    X = Xf[columns]
+    if len(X) < min_samples:
+        print("[INFO] Ez dago DBSCAN aplikatzeko datu nahikorik.")
+        return pd.DataFrame()
+    try:
+        X_scaled = StandardScaler().fit_transform(X)
+        labels = DBSCAN(eps=eps, min_samples=min_samples).fit_predict(X_scaled)
+        Xf.loc[:, "anomaly"] = labels == -1
+        anomalies = Xf.loc[Xf["anomaly"]].copy()
+        if not anomalies.empty:
+            anomalies.loc[:, "source"] = f"{talde}_multi"
+            print(f'[INFO] Anomaliak aurkitu dira {talde} sentsoreetan.')
+            return anomalies[["time"] + columns + ["source"]]
+        else:
+            print('[INFO] Ez da anomaliarik aurkitu.')
+            return pd.DataFrame()
+    except Exception as e:
+        print(f'[ERROR] DBSCAN exekutatzean errorea: {e}.')
+        return pd.DataFrame()
+
+
+def dbscan_uni(df, column, eps):
+    if column not in df.columns:
+        print(f'[ERROR] Ez da zutabea existitzen: {column}')
+        return pd.DataFrame()
+    Xf = df.dropna(subset=[column])
+    X = Xf[[column]]
+    if len(X) < min_samples:
+        print("[INFO] Ez dago DBSCAN aplikatzeko datu nahikorik.")
+        return pd.DataFrame()
+    try:
+        X_scaled = StandardScaler().fit_transform(X)
+        labels = DBSCAN(eps=eps, min_samples=min_samples).fit_predict(X_scaled)
+        Xf.loc[:, "anomaly"] = labels == -1
+        anomalies = Xf.loc[Xf["anomaly"]].copy()
+        if not anomalies.empty:
+            print(f'[INFO] Anomaliak aurkitu dira {column} sentsoreetan.')
+            anomalies.loc[:, "source"] = f"{column}_uni"
+            return anomalies[["time", column, "source"]]
+        else:
+            print('[INFO] Ez da anomaliarik aurkitu.')
+            return pd.DataFrame()
+    except Exception as e:
+        print(f'[ERROR] DBSCAN exekutatzean errorea: {e}.')
+        return pd.DataFrame()
+
+
+def window_slices(times, seconds):
+    # [t0 + k*W, t0 + (k+1)*W) leihoen (hasiera, bukaera) indizeak,
+    # hasiera azken lagina baino lehenago dagoen bitartean.
+    times = pd.DatetimeIndex(times).as_unit("ns").asi8
+    if not len(times):
+        return []
+    width = int(pd.Timedelta(seconds=seconds).value)
+    starts = np.arange(times[0], times[-1], width, dtype=np.int64)
+    lo = np.searchsorted(times, starts, "left")
+    hi = np.searchsorted(times, starts + width, "left")
+    return [(a, b) for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+
+
+def detect_window(df, columns, eps, talde=None):
+    # talde None bada, aldagai bakarreko DBSCAN-a columns[0]-en.
+    if talde is None:
+        return dbscan_uni(df, columns[0], eps)
+    return dbscan_multi(df, columns, talde, eps)
+
+
+def submit_windows(executor, df, columns, eps, talde=None,
+                   seconds=ventana_segundos):
+    # Leiho bakoitzeko etorkizuna (edo emaitza, executor None bada).
+    if 'time' not in df.columns:
+        print('[ERROR] DataFrame-ak ez du "time" zutabea.')
+        return []
+    df = df.dropna(subset=columns).sort_values('time').reset_index(drop=True)
+    tasks = []
+    for lo, hi in window_slices(df['time'], seconds):
+        window = df.iloc[lo:hi]
+        if executor is None:
+            tasks.append(detect_window(window, columns, eps, talde))
+        else:
+            tasks.append(executor.submit(detect_window, window, columns,
+                                         eps, talde))
+    return tasks
+
+
+def collect(tasks):
+    anomalies = [t if isinstance(t, pd.DataFrame) else t.result()
+                 for t in tasks]
+    anomalies = [a for a in anomalies if not a.empty]
+    if anomalies:
+        return pd.concat(anomalies).reset_index(drop=True)
+    return pd.DataFrame()
+
+
+def detect_windows(df, columns, eps, talde=None, seconds=ventana_segundos,
+                   executor=None):
+    return collect(submit_windows(executor, df, columns, eps, talde,
+                                  seconds))
+
+
+def load_folder(folder_path):
+    # Sentsore guztien DataFrame-ak; fitxategiren bat falta bada None.
+    dataframes = {}
+    for sensor_name, csv_file in csv_files_list.items():
+        file = os.path.join(folder_path, csv_file)
+        try:
+            # Cache bitarra (.npy) baliozkoa bada hortik irakurri.
+            dataframes[sensor_name] = daycache.read_frame(file)
+            print(f"[INFO] '{csv_file}' artxiboa irakurrita.")
+        except FileNotFoundError:
+            print(f"[ERROR]: Ez da '{csv_file}' fitxategia aurkitu.")
+            return None
+        except KeyError as e:
+            print(f"[ERROR]: '{e}' faltan '{csv_file}' artxiboan.")
+            return None
+    return dataframes
+
+
+def group_frame(dataframes, columns):
+    # Sentsoreak denboraz lerrokatuta, ALIGN_PERIOD_MS saretan.
+    df = alignment.align_frames({col: dataframes[col] for col in columns},
+                                "time")
+    return df if not df.empty else pd.DataFrame(columns=["time"] + columns)
+
+
+def folder_groups(dataframes):
+    # (izena, DataFrame, zutabeak, eps, talde) analizatu beharreko taldeak.
+    return [
+        ("rf", group_frame(dataframes, rf_taldea_cols), rf_taldea_cols,
+         eps_dict["rf_taldea"], "rf_taldea"),
+        ("huts", group_frame(dataframes, huts_taldea_cols), huts_taldea_cols,
+         eps_dict["huts_taldea"], "huts_taldea"),
+        ("CameraLuminosity", dataframes["CameraLuminosity"].copy(),
+         ["CameraLuminosity"], eps_dict["CameraLuminosity"], None),
+    ]
+
+
+def run_all(data_dir, output, workers=None, seconds=ventana_segundos):
+    # Karpeta guztien leiho guztiak prozesu multzoan; emaitzak CSV-ra.
+    folders = sorted(d for d in os.listdir(data_dir)
+                     if os.path.isdir(os.path.join(data_dir, d))
+                     and not d.startswith(('.', '_')))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for folder in folders:
+            print(f"[INFO] '{folder}' karpeta irakurtzen.")
+            dataframes = load_folder(os.path.join(data_dir, folder))
+            if dataframes is None:
+                continue
+            for name, df, columns, eps, talde in folder_groups(dataframes):
+                pending.append((folder, submit_windows(
+                    executor, df, columns, eps, talde, seconds)))
+        for folder, tasks in pending:
+            anomalies = collect(tasks)
+            if not anomalies.empty:
+                anomalies.insert(0, "folder", folder)
+                results.append(anomalies)
+    result = (pd.concat(results).reset_index(drop=True) if results
+              else pd.DataFrame(columns=["folder", "time", "source"]))
+    result.to_csv(output, index=False)
+    print(f"[INFO] {len(result)} anomalia '{output}'-en gordeta.")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("data_dir", nargs="?", default='.')
+    parser.add_argument("--output", default="anomaliak.csv")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="prozesu kopurua (lehenetsia: nukleo kopurua)")
+    parser.add_argument("--seconds", type=float, default=ventana_segundos)
+    args = parser.parse_args()
+    run_all(args.data_dir, args.output, args.workers, args.seconds)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Eguneko CSV-en cache bitar zutabekaria (.npy, memory-map bidez irakurtzeko).
+
+Sentsore bakoitzeko CSV-a behin bihurtzen da karpetako .cache/ azpikarpetan:
+<izena>.time.npy (int64 ns, UTC, ordenatuta), <izena>.values.npy (float64)
+eta <izena>.json (zutabeak eta CSV-aren mtime/tamaina). CSV-a aldatzen
+bada cache-a baliogabetu eta berriro sortzen da.
+
+Karpeta guztiak aldez aurretik bihurtzeko:
+    python daycache.py ../data
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_COLUMN = 'time'
+INDEX_COLUMN = 0
+CACHE_DIR = '.cache'
+
+
+def cache_paths(csv_path):
+    folder, name = os.path.split(csv_path)
+    stem = os.path.join(folder, CACHE_DIR, os.path.splitext(name)[0])
+    return stem + '.time.npy', stem + '.values.npy', stem + '.json'
+
+
+def csv_signature(csv_path):
+    st = os.stat(csv_path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def read_meta(csv_path):
+    # Cache baliozkoa bada bere metadatuak, bestela None.
+    signature = csv_signature(csv_path)
+    times_path, values_path, meta_path = cache_paths(csv_path)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (meta.get("csv") != signature or not os.path.exists(times_path)
+            or not os.path.exists(values_path)):
+        return None
+    return meta
+
+
+def parse_csv(csv_path):
+    df = pd.read_csv(csv_path, parse_dates=[TIMESTAMP_COLUMN],
+                     index_col=INDEX_COLUMN)
+    df = df.sort_values(by=TIMESTAMP_COLUMN, kind="stable")
+    columns = [c for c in df.columns if c != TIMESTAMP_COLUMN]
+    times = pd.DatetimeIndex(df[TIMESTAMP_COLUMN]).as_unit("ns").asi8
+    return times, df[columns].to_numpy(dtype=np.float64), columns
+
+
+def write_cache(csv_path, times, values, columns):
+    times_path, values_path, meta_path = cache_paths(csv_path)
+    os.makedirs(os.path.dirname(times_path), exist_ok=True)
+    signature = csv_signature(csv_path)
+    # Lehenik array-ak, eta metadatuak azkenik: erdizka idatzitako cache-a
+    # ez da inoiz baliozkotzat hartzen.
+    for path, array in ((times_path, times), (values_path, values)):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp, path)
+    tmp = meta_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({"csv": signature, "columns": columns}, f)
+    os.replace(tmp, meta_path)
+
+
+def load(csv_path, write=True):
+    # (times, values, columns): cache-tik (mmap) edo CSV-tik, eta kasu
+    # horretan cache-a idatzi (karpetan idazterik ez badago, ez da ezer egiten)
+    meta = read_meta(csv_path)
+    if meta is not None:
+        times_path, values_path, _ = cache_paths(csv_path)
+        return (np.load(times_path, mmap_mode='r'),
+                np.load(values_path, mmap_mode='r'), meta["columns"])
+    times, values, columns = parse_csv(csv_path)
+    if write:
+        try:
+            write_cache(csv_path, times, values, columns)
+        except OSError as e:
+            print(f"[INFO] Ezin izan da cache-a idatzi '{csv_path}': {e}")
+    return times, values, columns
+
+
+def read_frame(csv_path):
+    # pd.read_csv(parse_dates) + sort_values + reset_index-en DataFrame bera.
+    times, values, columns = load(csv_path)
+    df = pd.DataFrame(np.asarray(values), columns=columns)
+    df.insert(0, TIMESTAMP_COLUMN, pd.DatetimeIndex(
+        np.asarray(times).view("datetime64[ns]")).tz_localize("UTC"))
+    return df
+
+
+def iter_chunks(csv_path, chunk_rows):
+    # (times, values, columns) zatiak, gehienez chunk_rows errenkadakoak.
+    # Cache-tik mmap zatiak; bestela CSV-a zatika (ordenatuta egon behar du,
+    # ez baita fitxategi osoa memorian kargatzen).
+    if read_meta(csv_path) is not None:
+        times, values, columns = load(csv_path)
+        for start in range(0, len(times), chunk_rows):
+            yield (np.array(times[start:start + chunk_rows]),
+                   np.array(values[start:start + chunk_rows]), columns)
+        return
+    last = None
+    reader = pd.read_csv(csv_path, parse_dates=[TIMESTAMP_COLUMN],
+                         index_col=INDEX_COLUMN, chunksize=chunk_rows)
+    for df in reader:
+        columns = [c for c in df.columns if c != TIMESTAMP_COLUMN]
+        times = pd.DatetimeIndex(df[TIMESTAMP_COLUMN]).as_unit("ns").asi8
+        if ((np.diff(times) < 0).any()
+                or (last is not None and len(times) and times[0] < last)):
+            raise ValueError(f"'{csv_path}' ez dago denboraren arabera "
+                             "ordenatuta")
+        if len(times):
+            last = times[-1]
+        yield times, df[columns].to_numpy(dtype=np.float64), columns
+
+
+def convert_all(data_dir):
+    for folder in sorted(os.listdir(data_dir)):
+        folder_path = os.path.join(data_dir, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for name in sorted(os.listdir(folder_path)):
+            if not name.endswith('.csv'):
+                continue
+            csv_path = os.path.join(folder_path, name)
+            if read_meta(csv_path) is None:
+                write_cache(csv_path, *parse_csv(csv_path))
+                print(f"[INFO] '{csv_path}' cache-ra bihurtuta.")
+
+
+if __name__ == "__main__":
+    convert_all(sys.argv[1] if len(sys.argv) > 1 else '/app/data/')
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+paho MQTT bezeroaren gaineko asyncio argitaratzailea.
+
+Mezu bakoitzak "inflight" leihoan leku bat hartzen du broker-ak jaso duela
+baieztatu arte (QoS 1: PUBACK, QoS 0: socket-ean idatzita). Leihoa beteta
+badago publish() zain geratzen da, eta horrela errepikapen begiztak
+broker-aren abiadura jarraitzen du datuak galdu gabe.
+"""
+
+import asyncio
+import math
+import time
+
+import paho.mqtt.client as mqtt
+
+
+class LatencyHistogram:
+    """Publikatze latentziak (s) 2-ren berredurako ontzietan (ms)."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1e3
+        bucket = 0 if ms <= 0.125 else math.ceil(math.log2(ms / 0.125))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        # Ontziaren goiko muga (s), q kuantila dagoen ontziarena.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(0.125 * 2 ** bucket / 1e3, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count,
+                "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.quantile(0.5),
+                "p95": self.quantile(0.95),
+                "p99": self.quantile(0.99),
+                "max": self.max}
+
+
+class AsyncPublisher:
+
+    def __init__(self, client, qos=0, max_inflight=100, verbose=True):
+        self.client = client
+        self.qos = qos
+        self.verbose = verbose
+        self.loop = asyncio.get_running_loop()
+        self.window = asyncio.Semaphore(max_inflight)
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self._pending = {}
+        self._drained = asyncio.Event()
+        self._drained.set()
+        client.on_publish = self._on_publish
+
+    def _on_publish(self, client, userdata, mid, *args):
+        # paho-ren haritik deitzen da; lana asyncio begiztara pasatu.
+        self.loop.call_soon_threadsafe(self._acked, mid)
+
+    def _acked(self, mid):
+        t0 = self._pending.pop(mid, None)
+        if t0 is None:
+            return
+        self.latency.add(time.perf_counter() - t0)
+        self.window.release()
+        if not self._pending:
+            self._drained.set()
+
+    async def publish(self, topic, payload):
+        # Leihoa beteta badago hemen itxaron (backpressure).
+        await self.window.acquire()
+        t0 = time.perf_counter()
+        result = self.client.publish(topic, payload, qos=self.qos)
+        # QoS > 0 denean paho-k NO_CONN mezua ilaran utzita itzultzen du, eta
+        # berriro konektatzean bidaliko du: ez da akatsa.
+        queued = (result.rc == mqtt.MQTT_ERR_SUCCESS
+                  or (result.rc == mqtt.MQTT_ERR_NO_CONN and self.qos > 0))
+        if not queued:
+            self.window.release()
+            self.errors += 1
+            print(f"[ERROR] {topic}-en publikatzerakoan: {result.rc}")
+            return False
+        # _acked begiztan exekutatzen da, beraz ezin da hau baino lehen heldu.
+        self._pending[result.mid] = t0
+        self._drained.clear()
+        if self.verbose:
+            print(f"[INFO]{topic}-en publikatuta: {payload}")
+        return True
+
+    async def drain(self, timeout=30.0):
+        # Bidalitako mezu guztiak baieztatu arte itxaron, gehienez `timeout`
+        # segundo (None: mugarik gabe). Konexioa galdu bada baieztapenak ez
+        # dira inoiz iritsiko: baieztatu gabekoak akats gisa zenbatu.
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            lost = len(self._pending)
+            print(f"[ERROR] {lost} mezu baieztatu gabe {timeout}s ondoren.")
+            self.errors += lost
+            for _ in range(lost):
+                self.window.release()
+            self._pending.clear()
+            self._drained.set()
+            return False
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Sentsore guztien gertaerak denboran ordenatuta dituen errepikapen motorra.
+
+Karpeta bakoitzeko CSV-ak NumPy array-etara bihurtzen dira behin, eta
+gertaera guztiak (sentsorea, errenkada) ordena global bakarrean jartzen
+dira argsort egonkor batekin. Ondoren gertaera bakoitzak O(1) lana dauka.
+"""
+
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import daycache
+
+
+class SensorData:
+    def __init__(self, times, values, columns):
+        # times: int64 ns (UTC), values: float64 (n, len(columns))
+        self.times = np.ascontiguousarray(times, dtype=np.int64)
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.columns = list(columns)
+
+    def __len__(self):
+        return len(self.times)
+
+
+def read_sensor(file):
+    # Cache bitarra baliozkoa bada hortik (mmap), bestela CSV-a irakurri.
+    return SensorData(*daycache.load(file))
+
+
+class EventStream:
+    """Sentsore guztien gertaerak denbora-ordena globalean."""
+
+    def __init__(self, sensors):
+        self.names = list(sensors)
+        self.columns = [sensors[name].columns for name in self.names]
+        counts = [len(sensors[name]) for name in self.names]
+        times = np.concatenate([sensors[name].times for name in self.names])
+        sensor = np.repeat(np.arange(len(self.names)), counts)
+        row = np.concatenate([np.arange(c) for c in counts])
+        # Argsort egonkorra: timestamp berdinetan sentsoreen ordena mantendu.
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.sensor = sensor[order].tolist()
+        self.row = row[order].tolist()
+        # Balioak Python zerrendetan behin, gertaera bakoitzean pandas gabe.
+        self._values = [sensors[name].values.tolist() for name in self.names]
+
+    def __len__(self):
+        return len(self.times)
+
+    def tick_bounds(self):
+        # Timestamp berdina duten gertaera taldeen [hasiera, bukaera) mugak.
+        cuts = np.flatnonzero(np.diff(self.times)) + 1
+        starts = np.concatenate(([0], cuts)).tolist()
+        ends = np.concatenate((cuts, [len(self.times)])).tolist()
+        return list(zip(starts, ends))
+
+    def event(self, i):
+        # (sentsorea, {zutabea: balioa}) i. gertaerarentzat.
+        s = self.sensor[i]
+        return (self.names[s],
+                dict(zip(self.columns[s], self._values[s][self.row[i]])))
+
+
+def stream_blocks(readers):
+    """Sentsore bakoitzeko zati-iteradoreak EventStream bloke ordenatuetan.
+
+    readers: {izena: SensorData zatien iteradorea}. Bloke bakoitzak ur-marka
+    arteko gertaerak ditu: oraindik datu gehiago izan ditzaketen sentsoreen
+    bufferreko azken timestamp-en minimoa. Memoria zati baten tamainara
+    mugatzen da, grabazioaren luzera edozein dela ere.
+    """
+    pending = {name: None for name in readers}
+    done = set()
+    while True:
+        for name, reader in readers.items():
+            while ((pending[name] is None or not len(pending[name]))
+                   and name not in done):
+                try:
+                    pending[name] = next(reader)
+                except StopIteration:
+                    done.add(name)
+        active = [name for name in readers
+                  if pending[name] is not None and len(pending[name])]
+        if not active:
+            return
+        limits = [pending[name].times[-1] for name in active
+                  if name not in done]
+        watermark = min(limits) if limits else None
+        parts = {}
+        for name in active:
+            data = pending[name]
+            cut = (len(data) if watermark is None
+                   else int(np.searchsorted(data.times, watermark, "right")))
+            if cut:
+                parts[name] = SensorData(data.times[:cut], data.values[:cut],
+                                         data.columns)
+                pending[name] = SensorData(data.times[cut:],
+                                           data.values[cut:], data.columns)
+        yield EventStream(parts)
+
+
+def sensor_chunks(file, chunk_rows):
+    for times, values, columns in daycache.iter_chunks(file, chunk_rows):
+        yield SensorData(times, values, columns)
+
+
+def format_ns(ns):
+    # pd.Timestamp(ns, tz="UTC").isoformat(timespec="nanoseconds")-ren
+    # formatu bera, baina pandas objekturik sortu gabe.
+    sec, frac = divmod(int(ns), 1_000_000_000)
+    return (time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+            + f".{frac:09d}+00:00")
+
+
+def parse_speed(value):
+    # "max" -> None (itxaron gabe), bestela abiadura faktorea (>0).
+    if str(value).strip().lower() in ("max", "0", "inf"):
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise ValueError(f"Abiadura faktore okerra: {value}")
+    return speed
+
+
+class SyntheticClock:
+    """Grabatutako denbora erloju sintetiko batera mugitzen du.
+
+    Gertaeren arteko tarteak (eta karpeten arteko etena) mantentzen dira,
+    errepikapen abiadura edozein dela ere, InfluxDB iraganeko edo
+    etorkizuneko datuekin betetzeko.
+    """
+
+    def __init__(self, start="now"):
+        if start.strip().lower() == "now":
+            self.base = time.time_ns()
+        else:
+            ts = pd.Timestamp(start)
+            if ts.tzinfo is None:
+                ts = ts.tz_localize("UTC")
+            self.base = ts.as_unit("ns").value
+        self.origin = None
+
+    def begin(self, first_ns):
+        # Karpeta berri baten lehen gertaera erloju sintetikoaren unera lotu.
+        self.origin = int(first_ns)
+
+    def end(self, last_ns, pause_s=0):
+        self.base += int(last_ns) - self.origin + int(pause_s * 1e9)
+
+    def __call__(self, t_ns):
+        return self.base + int(t_ns) - self.origin
+
+
+class DeadlineScheduler:
+    """Errepikapen hasierarekiko muga absolutuak dituen planifikatzailea.
+
+    Tick bakoitzaren muga hasierako unetik kalkulatzen da, ez aurreko
+    itxaronalditik, beraz publikatzeko kostuak ez dira pilatzen. Atzeratuta
+    badago, muga pasatu duten tick guztiak batera itzultzen dira.
+    """
+
+    def __init__(self, speed, clock=time.monotonic, max_batch=1000):
+        self.speed = speed
+        self.clock = clock
+        # "max" moduan ere tick-ak zatika itzuli, txostenak egin ahal izateko
+        self.max_batch = max_batch
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.batches = 0
+        self.ticks = 0
+
+    def start(self, first_ns):
+        self.origin = int(first_ns)
+        self.wall0 = self.clock()
+
+    def deadline(self, t_ns):
+        return self.wall0 + (int(t_ns) - self.origin) / 1e9 / self.speed
+
+    def delay(self, t_ns):
+        # Mugara arte falta diren segundoak (<= 0 atzeratuta badago).
+        if self.speed is None:
+            return 0.0
+        return self.deadline(t_ns) - self.clock()
+
+    def due(self, times, k):
+        # times[k:]-tik muga pasatu duten tick-en amaiera indizea (> k).
+        if self.speed is None:
+            end = min(len(times), k + self.max_batch)
+            self.lag = 0.0
+        else:
+            now = self.clock()
+            self.lag = max(0.0, now - self.deadline(times[k]))
+            due_ns = self.origin + (now - self.wall0) * self.speed * 1e9
+            end = max(k + 1, int(np.searchsorted(times, due_ns, "right")))
+        self.max_lag = max(self.max_lag, self.lag)
+        self.batches += 1
+        self.ticks += end - k
+        return end
+
+    def reset_stats(self):
+        self.max_lag = 0.0
+        self.batches = 0
+        self.ticks = 0
+
+
+class PayloadBatcher:
+    """Hainbat lagin MQTT mezu bakarrean (objektuen JSON array) biltzen ditu.
+
+    Timestamp bakoitzeko objektu bat sortzen da, une horretako sentsore
+    guztiekin. max_samples None bada, timestamp bakoitzak bere mezua du;
+    bestela mezua max_samples lagin pilatu arte betetzen da.
+    """
+
+    def __init__(self, max_samples=None):
+        self.max_samples = max_samples
+        self.objects = []
+        self.samples = 0
+
+    def add(self, emit_ns, events):
+        obj = {"time": format_ns(emit_ns)}
+        for _, data_row in events:
+            obj.update(data_row)
+        self.objects.append(obj)
+        self.samples += len(events)
+
+    def ready(self):
+        return bool(self.objects) and (self.max_samples is None
+                                       or self.samples >= self.max_samples)
+
+    def flush(self):
+        payload = json.dumps(self.objects)
+        self.objects = []
+        self.samples = 0
+        return payload
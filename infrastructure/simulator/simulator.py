@@ -5,13 +5,18 @@ Created on Thu May 15 09:34:56 2025
 @author: Urko López Sácristan
 """
 
-import pandas as pd
 import paho.mqtt.client as mqtt
+import asyncio
+import itertools
+import multiprocessing
 import time
 import os
 import json
 import sys
 
+import replay
+from publisher import AsyncPublisher
+
 csv_files_list = {
     'CameraLuminosity': 'CameraLuminosity_df.csv',
     'ForwardPower': 'ForwardPower_df.csv',
@@ -26,12 +31,37 @@ csv_files_list = {
 }
 
 MQTT_BROKER = os.environ.get('MQTT_BROKER_HOST', 'mqtt_broker')
-MQTT_PORT = 1883
+MQTT_PORT = int(os.environ.get('MQTT_PORT', 1883))
 MQTT_TOPIC_PREFIX = os.environ.get('MQTT_TOPIC_PREFIX', 'sensor')
-INDEX_COLUMN = 0
-TIMESTAMP_COLUMN = 'time'
-DATA_DIR = '/app/data/'
-DAY_SLEEP = 60
+DATA_DIR = os.environ.get('DATA_DIR', '/app/data/')
+DAY_SLEEP = float(os.environ.get('DAY_SLEEP', 60))
+# Errepikapen abiadura: 1 = denbora erreala, 10 = 10x, "max" = itxaron gabe.
+REPLAY_SPEED = replay.parse_speed(os.environ.get('REPLAY_SPEED', '1'))
+# Ezarrita badago ("now" edo ISO data), "time" eremua erloju sintetiko
+# batetik idazten da grabatutako tarteak mantenduz (InfluxDB betetzeko).
+SYNTHETIC_CLOCK = os.environ.get('SYNTHETIC_CLOCK', '')
+# Atzerapen metrika zenbatero (s) publikatu; 0 bada, ez da publikatzen.
+LAG_REPORT_INTERVAL = float(os.environ.get('LAG_REPORT_INTERVAL', 10))
+# Payload modua: "sensor" (lagin bakoitza bere topic-ean), "timestamp"
+# (timestamp berdineko sentsoreak mezu batean) edo "samples" (segidako
+# PAYLOAD_BATCH_SIZE lagin mezu batean). Bi azkenak <prefix>/batch-era.
+PAYLOAD_MODE = os.environ.get('PAYLOAD_MODE', 'sensor')
+PAYLOAD_BATCH_SIZE = int(os.environ.get('PAYLOAD_BATCH_SIZE', 50))
+# MQTT QoS maila eta baieztatu gabeko mezuen leiho maximoa (backpressure).
+MQTT_QOS = int(os.environ.get('MQTT_QOS', 1))
+MAX_INFLIGHT = int(os.environ.get('MAX_INFLIGHT', 100))
+# Bukaeran baieztapenen zain gehienez itxarongo den denbora (s).
+DRAIN_TIMEOUT = float(os.environ.get('DRAIN_TIMEOUT', 30))
+# Aldi berean simulatzen diren azeleragailu lerroak. 1 baino gehiago bada,
+# lerro bakoitza bere prozesuan doa <prefix>/line<k>/... topic-ekin, eta
+# karpeten zerrenda k posizio biratuta errepikatzen du.
+REPLAY_LINES = int(os.environ.get('REPLAY_LINES', 1))
+# > 0 bada, CSV-ak STREAM_CHUNK_ROWS errenkadako zatika irakurtzen dira eta
+# bidean ordenatzen: errepikapena berehala hasten da eta memoria zatiaren
+# tamainara mugatzen da (CSV-ak denboraren arabera ordenatuta egon behar dute)
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 0))
+# Mezu bakoitzaren log-a (0 bada, abiadura handietan print-ak saihestu).
+VERBOSE = os.environ.get('SIMULATOR_VERBOSE', '1') == '1'
 
 
 def on_connect(client, userdata, flags, rc):
@@ -41,117 +71,212 @@ def on_connect(client, userdata, flags, rc):
         print(f"[ERROR] MQTT Broker-era konektatzean arazoa, kodea: {rc}")
 
 
-def publish_data(client, topic, payload):
-    result = client.publish(topic, payload)
-    if result[0] == 0:
-        print(f"[INFO]{topic}-en publikatuta: {payload}")
-    else:
-        print(f"[ERROR] {topic}-en publikatzerakoan: {result}")
+async def report_lag(publisher, scheduler, prefix):
+    # Planifikatzailearen atzerapena eta publikatze latentziak metrika moduan
+    # (Telegraf-ek gordetzen ditu).
+    latency = publisher.latency.summary()
+    print(f"[INFO] Atzerapena: {scheduler.lag:.3f}s (max "
+          f"{scheduler.max_lag:.3f}s), {scheduler.ticks} tick "
+          f"{scheduler.batches} sortatan. Latentzia p50 "
+          f"{latency['p50'] * 1e3:.2f}ms, p99 {latency['p99'] * 1e3:.2f}ms, "
+          f"max {latency['max'] * 1e3:.2f}ms ({latency['count']} mezu).")
+    data_row = {"SimulatorLag": scheduler.lag,
+                "SimulatorMaxLag": scheduler.max_lag,
+                "PublishLatencyP50": latency["p50"],
+                "PublishLatencyP95": latency["p95"],
+                "PublishLatencyP99": latency["p99"],
+                "PublishLatencyMax": latency["max"],
+                "PublishErrors": publisher.errors,
+                "time": replay.format_ns(time.time_ns())}
+    await publisher.publish(f"{prefix}/SimulatorLag",
+                            json.dumps(data_row))
+    scheduler.reset_stats()
+    publisher.latency.reset()
+
+
+def load_folder(folder_path):
+    sensors = {}
+    # Fitxategi guztiak irakurri eta hiztegi batean gorde array-ak.
+    for sensor_name, csv_file in csv_files_list.items():
+        file = os.path.join(folder_path, csv_file)
+        try:
+            sensors[sensor_name] = replay.read_sensor(file)
+            print(f"[INFO] '{csv_file}' artxiboa irakurrita.")
+        except FileNotFoundError:
+            print(f"[ERROR]: Ez da '{csv_file}' fitxategia aurkitu.")
+            return {}
+        except KeyError as e:
+            print(f"[ERROR]: '{e}' faltan '{csv_file}' artxiboan.")
+            return {}
+    return sensors
+
+
+def open_folder(folder_path):
+    # Sentsore bakoitzaren zati-irakurlea ireki, eta lehen zatia irakurri
+    # akatsak errepikapena hasi aurretik ikusteko.
+    readers = {}
+    for sensor_name, csv_file in csv_files_list.items():
+        file = os.path.join(folder_path, csv_file)
+        try:
+            chunks = replay.sensor_chunks(file, STREAM_CHUNK_ROWS)
+            first = next(chunks, None)
+        except FileNotFoundError:
+            print(f"[ERROR]: Ez da '{csv_file}' fitxategia aurkitu.")
+            return {}
+        except (KeyError, ValueError) as e:
+            print(f"[ERROR]: '{e}' '{csv_file}' artxiboan.")
+            return {}
+        readers[sensor_name] = (itertools.chain([first], chunks)
+                                if first is not None else iter(()))
+        print(f"[INFO] '{csv_file}' artxiboa zatika irekita.")
+    return readers
+
+
+def folder_blocks(folder_path):
+    # Karpetaren gertaerak EventStream blokeetan: osorik (bloke bakarra) edo
+    # STREAM_CHUNK_ROWS > 0 bada, zatika irakurri eta bidean ordenatuta.
+    if STREAM_CHUNK_ROWS > 0:
+        readers = open_folder(folder_path)
+        return replay.stream_blocks(readers) if readers else None
+    sensors = load_folder(folder_path)
+    # Gertaera guztiak behin ordenatu, ondoren O(1) gertaera bakoitzeko
+    return [replay.EventStream(sensors)] if sensors else None
+
+
+async def replay_folder(publisher, blocks, scheduler, clock, batcher,
+                        prefix):
+    # Karpetako bloke guztiak errepikatu; azken timestamp-a itzultzen du.
+    batch_topic = f"{prefix}/batch"
+    last_report = time.monotonic()
+    last_ns = None
+    for stream in blocks:
+        if not len(stream):
+            continue
+        bounds = stream.tick_bounds()
+        tick_times = stream.times[[start for start, _ in bounds]]
+        if last_ns is None:
+            # Muga absolutuak karpetaren hasierarekiko: ez da atzerapenik
+            # pilatzen, eta atzeratuta badago tick-ak sortaka bidaltzen dira.
+            scheduler.start(tick_times[0])
+            if clock:
+                clock.begin(tick_times[0])
+        k = 0
+        while k < len(bounds):
+            wait = scheduler.delay(tick_times[k])
+            if wait > 0:
+                await asyncio.sleep(wait)
+            k_end = scheduler.due(tick_times, k)
+            for start, end in bounds[k:k_end]:
+                emit_ns = (clock(stream.times[start]) if clock
+                           else time.time_ns())
+                if batcher:
+                    batcher.add(emit_ns, [stream.event(i)
+                                          for i in range(start, end)])
+                    if batcher.ready():
+                        await publisher.publish(batch_topic, batcher.flush())
+                    continue
+                # Timestamp horri dagozkion datuak zerbitzarian publikatu.
+                for i in range(start, end):
+                    sensor_name, data_row = stream.event(i)
+                    data_row["time"] = replay.format_ns(emit_ns)
+                    # Sensore bakoitzarentzat topic batean publikatu.
+                    topic = f"{prefix}/{sensor_name}"
+                    await publisher.publish(topic, json.dumps(data_row))
+            k = k_end
+
+            if (LAG_REPORT_INTERVAL and time.monotonic() - last_report
+                    >= LAG_REPORT_INTERVAL):
+                await report_lag(publisher, scheduler, prefix)
+                last_report = time.monotonic()
+        last_ns = stream.times[-1]
+
+    if batcher and batcher.objects:
+        await publisher.publish(batch_topic, batcher.flush())
+    return last_ns
+
+
+async def run(client, subdir, prefix):
+    publisher = AsyncPublisher(client, MQTT_QOS, MAX_INFLIGHT, VERBOSE)
+    clock = (replay.SyntheticClock(SYNTHETIC_CLOCK)
+             if SYNTHETIC_CLOCK else None)
+    day_sleep = DAY_SLEEP / REPLAY_SPEED if REPLAY_SPEED else 0
+    scheduler = replay.DeadlineScheduler(REPLAY_SPEED)
+    batcher = None
+    if PAYLOAD_MODE != 'sensor':
+        batcher = replay.PayloadBatcher(
+            PAYLOAD_BATCH_SIZE if PAYLOAD_MODE == 'samples' else None)
+
+    for folder in subdir:
+        folder_path = os.path.join(DATA_DIR, folder)
+        print(f"[INFO] '{folder}' karpeta irakurtzen.")
+        blocks = folder_blocks(folder_path)
+        if blocks is None:
+            print("[ERROR]: Ez dira artxiboak kargatu. Irteten...")
+            sys.exit(1)
+
+        last_ns = await replay_folder(publisher, blocks, scheduler, clock,
+                                      batcher, prefix)
+
+        print(f"[INFO]: {folder}-eko datuen simulaizoa bukatuta.")
+        if clock and last_ns is not None:
+            clock.end(last_ns, DAY_SLEEP)
+        await asyncio.sleep(day_sleep)
+
+    # Baieztatu gabeko mezuak bidali arte itxaron.
+    await publisher.drain(DRAIN_TIMEOUT)
+    if LAG_REPORT_INTERVAL:
+        await report_lag(publisher, scheduler, prefix)
+        await publisher.drain(DRAIN_TIMEOUT)
+
+
+def replay_line(subdir, prefix):
+    # MQTT zerbitzaria hasiarazi
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    # paho-k ere leiho bera erabili dezala QoS > 0 mezuentzat (konektatu
+    # aurretik bakarrik alda daiteke).
+    client.max_inflight_messages_set(MAX_INFLIGHT)
+
+    # EMQX broker-ak denbora behar du hasteko...
+    client.connect(MQTT_BROKER, MQTT_PORT)
+    client.loop_start()
+
+    asyncio.run(run(client, subdir, prefix))
+
+    # MQTT broker-etik deskonektatu
+    client.loop_stop()
+    client.disconnect()
 
 
 if __name__ == "__main__":
     try:
-        subdir = [d for d in os.listdir(DATA_DIR)
-                  if os.path.isdir(os.path.join(DATA_DIR, d))]
+        subdir = sorted(d for d in os.listdir(DATA_DIR)
+                        if os.path.isdir(os.path.join(DATA_DIR, d)))
         if not subdir:
             print(f"[INFO]: Ez da azpikarpetarik aurkitu '{DATA_DIR}'-en.")
             sys.exit(0)
 
-        # MQTT zerbitzaria hasiarazi
-        client = mqtt.Client()
-        client.on_connect = on_connect
-
-        # EMQX broker-ak denbora behar du hasteko...
-        client.connect(MQTT_BROKER, MQTT_PORT)
-        client.loop_start()
-
-        for folder in subdir:
-            folder_path = os.path.join(DATA_DIR, folder)
-            print(f"[INFO] '{folder}' karpeta irakurtzen.")
-            dataframes = {}
-            # Fitxategi guztiak irakurri eta hiztegi batean gorde df-ak.
-            for sensor_name, csv_file in csv_files_list.items():
-                file = os.path.join(folder_path, csv_file)
-                try:
-                    df = pd.read_csv(file,
-                                     parse_dates=[TIMESTAMP_COLUMN],
-                                     index_col=INDEX_COLUMN)
-                    df = df.sort_values(by=TIMESTAMP_COLUMN)
-                    df = df.reset_index(drop=True)
-                    dataframes[sensor_name] = df
-                    print(f"[INFO] '{csv_file}' artxiboa irakurrita.")
-                except FileNotFoundError:
-                    print(f"[ERROR]: Ez da '{csv_file}' fitxategia aurkitu.")
-                    dataframes = {}
-                    break
-                except KeyError as e:
-                    print(f"[ERROR]: '{e}' faltan '{csv_file}' artxiboan.")
-                    dataframes = {}
-                    break
-
-            if not dataframes:
-                print("[ERROR]: Ez dira artxiboak kargatu. Irteten...")
+        if REPLAY_LINES <= 1:
+            replay_line(subdir, MQTT_TOPIC_PREFIX)
+        else:
+            # Lerro bakoitza bere prozesuan (GIL gabe, nukleo bakoitzean bat)
+            lines = []
+            for k in range(REPLAY_LINES):
+                folders = [subdir[(k + j) % len(subdir)]
+                           for j in range(len(subdir))]
+                prefix = f"{MQTT_TOPIC_PREFIX}/line{k}"
+                print(f"[INFO] {prefix} lerroa hasten: {folders}")
+                line = multiprocessing.Process(target=replay_line,
+                                               args=(folders, prefix),
+                                               name=f"line{k}")
+                line.start()
+                lines.append(line)
+            for line in lines:
+                line.join()
+            failed = [line.name for line in lines if line.exitcode != 0]
+            if failed:
+                print(f"[ERROR]: Lerro hauek huts egin dute: {failed}.")
                 sys.exit(1)
-
-            all_indices = {sensor: 0 for sensor in dataframes}
-            all_done = False
-            previous_timestamp = None
-
-            while not all_done:
-                current_timestamps = {}
-                next_data = {}
-                earliest_timestamp = None
-
-                # DataFrame guztien artean timestamp txikiena aurkitu
-                for sensor_name, df in dataframes.items():
-                    current_index = all_indices[sensor_name]
-                    if current_index < len(df):
-                        current_timestamps[sensor_name] = df.loc[
-                            current_index, TIMESTAMP_COLUMN]
-                        if (earliest_timestamp is None
-                            or current_timestamps[sensor_name] <
-                                earliest_timestamp):
-                            earliest_timestamp = current_timestamps[
-                                sensor_name]
-
-                if earliest_timestamp is None:
-                    all_done = True
-                    continue
-
-                # Timestamp horri dagozkion datuak zerbitzarian publikatu.
-                payload = {}
-                for sensor_name, df in dataframes.items():
-                    current_index = all_indices[sensor_name]
-                    if (current_index < len(df)
-                        and df.loc[current_index,
-                                   TIMESTAMP_COLUMN] == earliest_timestamp):
-                        data_row = df.drop(columns=[TIMESTAMP_COLUMN]).iloc[
-                            current_index].to_dict()
-                        current_time = pd.Timestamp.utcnow()
-                        data_row["time"] = current_time.isoformat(
-                            timespec="nanoseconds") + "Z"
-                        payload[sensor_name] = data_row
-                        # Sensore bakoitzarentzat topic batean publikatu.
-                        topic = f"{MQTT_TOPIC_PREFIX}/{sensor_name}"
-                        publish_data(client, topic, json.dumps(data_row))
-                        all_indices[sensor_name] += 1
-
-                # Itxarote denbora kalkulatu
-                if previous_timestamp is not None:
-                    time_difference = (earliest_timestamp -
-                                       previous_timestamp).total_seconds()
-                    if time_difference > 0:
-                        print(f"[INFO] {time_difference:.2f}s itxaroten...")
-                        time.sleep(time_difference)
-
-                previous_timestamp = earliest_timestamp
-
-            print(f"[INFO]: {folder}-eko datuen simulaizoa bukatuta.")
-            time.sleep(DAY_SLEEP)
-
-        # MQTT broker-etik deskonektatu
-        client.loop_stop()
-        client.disconnect()
         print("[INFO] Artxibo guztietarako simulazioak bukatuta.")
 
     except Exception as e:
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'applications'))
+from common import alignment, influx  # noqa: E402
+
+
+def frames():
+    # Bi sentsore, 30 ms-ko desfasearekin eta 70 ms-ro.
+    t0 = pd.Timestamp("2024-03-13", tz="UTC")
+    times = t0 + pd.to_timedelta(np.arange(20) * 70, unit="ms")
+    return {
+        "ForwardPower": pd.DataFrame({"_time": times,
+                                      "ForwardPower": np.arange(20.0)}),
+        "GasFlow": pd.DataFrame({"_time": times + pd.Timedelta("30ms"),
+                                 "GasFlow": np.arange(20.0) * 2}),
+    }
+
+
+def test_default_merge_keeps_sample_times():
+    assert alignment.ALIGN_PERIOD_MS == 0
+    dataframes = frames()
+    df = influx.combine_fields(dataframes)
+    expected = dataframes["ForwardPower"]
+    assert len(df) == len(expected)
+    assert df["_time"].equals(expected["_time"])
+    assert np.array_equal(df["GasFlow"], np.arange(20.0) * 2)
+
+
+def test_grid_merge_is_opt_in(monkeypatch):
+    monkeypatch.setattr(alignment, "ALIGN_PERIOD_MS", 100)
+    df = influx.combine_fields(frames())
+    ns = alignment.to_ns(df["_time"])
+    assert np.all(ns % int(100e6) == 0)
+    # 70 ms-ko sentsoreak 100 ms-ko saretara diezmatuta.
+    assert len(df) < 20
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import os
+import signal
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'applications', 'faults'))
+import faults  # noqa: E402
+
+
+def window(n=400):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({field: rng.normal(1.0, 0.1, n)
+                       for field in faults.fields})
+    df.insert(0, "_time", pd.date_range("2024-03-13", periods=n,
+                                        freq="100ms", tz="UTC"))
+    return df
+
+
+def kill_worker(pool):
+    for pid in list(pool._processes):
+        os.kill(pid, signal.SIGKILL)
+
+
+def check_restart(settle):
+    df = window()
+    pools = faults.make_pools(faults.groups, 2)
+    try:
+        assert len(faults.detect(df, pools)) == len(faults.groups)
+        broken = pools[0]
+        kill_worker(broken)
+        # settle > 0: pool-ak heriotza ikusi du submit() baino lehen;
+        # 0: etorkizunak berak huts egiten du.
+        time.sleep(settle)
+        results = faults.detect(df, pools)
+        assert len(results) == len(faults.groups)
+        assert pools[0] is not broken
+        assert len(faults.detect(df, pools)) == len(faults.groups)
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+
+def test_detect_restarts_worker_killed_between_cycles():
+    check_restart(0.5)
+
+
+def test_detect_restarts_worker_killed_before_result():
+    check_restart(0)
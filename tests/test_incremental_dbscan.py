@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'applications', 'faults'))
+from incremental_dbscan import IncrementalDBSCAN  # noqa: E402
+
+
+def window(rng, start, n):
+    # rf taldearen antzekoa: bi aldagai zaratatsu eta bat konstantea
+    # (IncidentPowerReference bezala).
+    times = np.arange(start, start + n, dtype=np.int64) * 10**8
+    values = np.column_stack([rng.normal(500, 10, n),
+                              rng.normal(0.1, 0.01, n),
+                              np.full(n, 3.0)])
+    return times, values
+
+
+def test_constant_column_does_not_force_rebuild():
+    rng = np.random.default_rng(0)
+    times, values = window(rng, 0, 2000)
+    engine = IncrementalDBSCAN(eps=0.5, min_samples=30)
+    engine.update(times, values)
+    assert engine.rebuilds == 1
+    for step in range(1, 6):
+        new_times, new_values = window(rng, 2000 + 100 * (step - 1), 100)
+        times = np.concatenate([times[100:], new_times])
+        values = np.concatenate([values[100:], new_values])
+        engine.update(times, values)
+    assert engine.rebuilds == 1
+
+
+def test_constant_column_still_rebuilds_on_shift():
+    rng = np.random.default_rng(1)
+    times, values = window(rng, 0, 2000)
+    engine = IncrementalDBSCAN(eps=0.5, min_samples=30)
+    engine.update(times, values)
+    values = values.copy()
+    values[:, 2] = 10.0
+    engine.update(times + 1, values)
+    assert engine.rebuilds == 2
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'applications'))
+from common import influx  # noqa: E402
+
+
+class QueryApi:
+    def __init__(self):
+        self.queries = []
+
+    def query_data_frame(self, query):
+        self.queries.append(query)
+        return pd.DataFrame()
+
+
+def queries(monkeypatch, line):
+    monkeypatch.setattr(influx, "LINE", line)
+    api = QueryApi()
+    influx.query_field(api, "bucket", "ForwardPower", "-800s")
+    influx.query_pivot(api, "bucket", ["ForwardPower", "GasFlow"], "-800s",
+                       "100ms")
+    influx.query_probe(api, "bucket", "ForwardPower", "-800s", "last")
+    return api.queries
+
+
+def test_queries_filter_on_line(monkeypatch):
+    for query in queries(monkeypatch, "line1"):
+        assert 'r["line"] == "line1"' in query
+
+
+def test_queries_without_line_do_not_filter(monkeypatch):
+    for query in queries(monkeypatch, ""):
+        assert 'r["line"]' not in query
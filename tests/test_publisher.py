@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import paho.mqtt.client as mqtt
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'infrastructure', 'simulator'))
+from publisher import AsyncPublisher  # noqa: E402
+
+
+class Client:
+    """paho bezeroaren ordezkoa: `rc` itzultzen du eta ez du baieztatzen."""
+
+    def __init__(self, rc=mqtt.MQTT_ERR_SUCCESS):
+        self.rc = rc
+        self.mid = 0
+        self.on_publish = None
+
+    def publish(self, topic, payload, qos=0):
+        self.mid += 1
+        return SimpleNamespace(rc=self.rc, mid=self.mid)
+
+
+def test_drain_gives_up_on_unacked_messages():
+    async def replay():
+        publisher = AsyncPublisher(Client(), qos=1, verbose=False)
+        for _ in range(3):
+            assert await publisher.publish("sensor/x", "{}")
+        drained = await publisher.drain(0.05)
+        return publisher, drained
+
+    publisher, drained = asyncio.run(replay())
+    assert not drained
+    assert publisher.errors == 3
+
+
+def test_no_conn_is_queued_with_qos():
+    async def replay(qos):
+        publisher = AsyncPublisher(Client(mqtt.MQTT_ERR_NO_CONN), qos=qos,
+                                   verbose=False)
+        sent = await publisher.publish("sensor/x", "{}")
+        return publisher, sent
+
+    publisher, sent = asyncio.run(replay(1))
+    assert sent and publisher.errors == 0
+    # QoS 0: paho-k ez du mezua gordetzen.
+    publisher, sent = asyncio.run(replay(0))
+    assert not sent and publisher.errors == 1
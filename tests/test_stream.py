@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'applications'))
+from common import stream, trigger  # noqa: E402
+
+
+class Client:
+    """paho bezeroaren ordezkoa: sortutako bezeroak zenbatzen ditu."""
+
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        Client.instances.append(self)
+
+    def connect(self, host, port):
+        pass
+
+    def loop_start(self):
+        pass
+
+
+def message(samples):
+    return SimpleNamespace(payload=json.dumps(samples).encode())
+
+
+def samples(n, start=0):
+    return [{"time": f"2024-03-13T00:00:{start + i:02d}Z",
+             "ForwardPower": float(i), "GasFlow": 1.0} for i in range(n)]
+
+
+def test_trigger_reuses_source_subscription(monkeypatch):
+    monkeypatch.setattr(stream.mqtt, "Client", Client)
+    Client.instances = []
+    source = stream.MqttSource(["ForwardPower", "GasFlow"], 50)
+    mqtt_trigger = trigger.make_trigger(None, "bucket", "ForwardPower", 50,
+                                        5, mode="mqtt", source=source)
+    assert len(Client.instances) == 1
+    mqtt_trigger.min_points = 3
+    waiter = threading.Thread(target=mqtt_trigger.wait)
+    waiter.start()
+    source.on_message(None, None, message(samples(3)))
+    waiter.join(timeout=5)
+    assert not waiter.is_alive()
+    assert len(source.read()) == 3
+
+
+def test_trigger_without_mqtt_source_only_counts(monkeypatch):
+    monkeypatch.setattr(stream.mqtt, "Client", Client)
+    Client.instances = []
+    mqtt_trigger = trigger.make_trigger(None, "bucket", "ForwardPower", 50,
+                                        5, mode="mqtt")
+    client, = Client.instances
+    client.on_message(None, None, message(samples(4)))
+    assert mqtt_trigger.count == 4
+    # Leihoa ez da inoiz irakurtzen: laginak ez dira gordetzen.
+    source = client.on_message.__self__
+    assert source.pending["ForwardPower"] == ([], [])
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'applications'))
+from common import influx, trigger  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Client:
+    def query_api(self):
+        return None
+
+
+def probe_trigger(monkeypatch, newest_at, count=0):
+    # newest_at(now): erlojuaren unean InfluxDB-ko azken timestamp-a.
+    clock = Clock()
+
+    def query_probe(query_api, bucket, field, start, fn):
+        return newest_at(clock.now) if fn == "last" else count
+
+    monkeypatch.setattr(influx, "query_probe", query_probe)
+    probe = trigger.ProbeTrigger(Client(), "bucket", "field", 50, cycle=15,
+                                 min_points=10, poll=1, max_wait=60,
+                                 clock=clock)
+    return probe, clock
+
+
+def test_probe_backs_off_while_idle(monkeypatch):
+    t0 = pd.Timestamp("2024-03-13", tz="UTC")
+    # Datuak 40 s-ra iristen dira.
+    probe, clock = probe_trigger(
+        monkeypatch, lambda now: t0 + pd.Timedelta(seconds=now // 40 * 40),
+        count=10)
+    probe.wait()
+    assert clock.sleeps[:7] == [1, 1, 2, 4, 8, 15, 15]
+    # Aldaketa ikustean hasierako tartera itzultzen da.
+    assert clock.now < 40 + 15
+
+
+def test_probe_resets_backoff_on_new_data(monkeypatch):
+    t0 = pd.Timestamp("2024-03-13", tz="UTC")
+    # Puntu bakarra segundoro: beti aldatzen da baina min_points-era ez da
+    # iristen, beraz max_wait arte `poll`-ekin jarraitzen du.
+    probe, clock = probe_trigger(
+        monkeypatch, lambda now: t0 + pd.Timedelta(seconds=now), count=1)
+    probe.wait()
+    assert set(clock.sleeps) == {1}
+    assert clock.now == 60